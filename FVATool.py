@@ -3,20 +3,57 @@ import os
 import time
 import tempfile
 import base64
+import gc
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, List
-from collections import deque
+from typing import Dict, Any, List, Tuple
 
-from flask import Flask, request, jsonify
+try:
+    import fcntl  # POSIX only; needed for the shared session store
+except ImportError:
+    fcntl = None
+
+try:
+    from flask_sock import Sock  # enables the /stream WebSocket endpoint
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+    ConnectionClosed = None
+
+try:
+    import orjson  # optional; faster JSON encoding of responses
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # optional; application/msgpack responses
+except ImportError:
+    msgpack = None
+
+from flask import Flask, request, jsonify, g, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import torch
 import numpy as np
 import librosa
+import soxr  # installed with librosa; its ResampleStream keeps filter state across /stream frames
+import soundfile as sf
 import cv2
 
-from transformers import Wav2Vec2ForSequenceClassification, Wav2Vec2FeatureExtractor
-from ultralytics import YOLO
-
 # -----------------------
 # Config
 # -----------------------
@@ -24,62 +61,341 @@ MODEL_NAME = "prithivMLmods/Speech-Emotion-Classification"
 MODEL_VERSION = "v1.0-prithivMLmods"
 BUFFER_SR = 16000
 MAX_BUFFER_SECONDS = 5  # seconds kept in rolling buffer per session
+SESSION_IDLE_TTL_S = float(os.environ.get("SESSION_IDLE_TTL_S", "300"))  # drop sessions idle this long
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))  # budget for all session buffers
+# "local" keeps sessions in this process; "shared" maps them from files so every worker on the host sees them
+SESSION_STORE = os.environ.get("SESSION_STORE", "local").lower()
+SESSION_SHARED_DIR = os.environ.get(
+    "SESSION_SHARED_DIR",
+    "/dev/shm/fvatool_sessions" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "fvatool_sessions")
+)
+SESSION_SWEEP_INTERVAL_S = 10.0  # how often the shared store scans for idle sessions
+# Share of the free space in SESSION_SHARED_DIR the shared store may use; /dev/shm is often only 64 MB
+# (Docker's default) and also holds the DSP pool's shared memory
+SESSION_SHARED_FREE_FRACTION = float(os.environ.get("SESSION_SHARED_FREE_FRACTION", "0.5"))
 VIDEO_MODEL_PATH = "best.pt"  # YOLO model path
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "1") == "1"  # run dummy inputs through the models after loading
+MODEL_WAIT_TIMEOUT_S = float(os.environ.get("MODEL_WAIT_TIMEOUT_S", "30"))  # how long a request waits for a loading model
+MODEL_AUTOLOAD = os.environ.get("MODEL_AUTOLOAD", "1") == "1"  # 0: importing the module loads no models (tests, tooling)
+# Copy-on-write model sharing: with `gunicorn --preload` and MODEL_PRELOAD=1 the master loads the models
+# once and every forked worker shares those pages; warmup then runs in each worker after the fork.
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "0") == "1"
+MODEL_MMAP_WEIGHTS = os.environ.get("MODEL_MMAP_WEIGHTS", "0") == "1"  # serve torch weights from a memory-mapped file
+MODEL_MMAP_DIR = os.environ.get("MODEL_MMAP_DIR", os.path.join(tempfile.gettempdir(), "fvatool_weights"))
+# torch.load(mmap=True) and load_state_dict(assign=True) arrived in torch 2.1 (requirements.txt pins 2.0.1)
+TORCH_SUPPORTS_MMAP = tuple(int(p) for p in torch.__version__.split("+")[0].split(".")[:2]) >= (2, 1)
+if MODEL_MMAP_WEIGHTS and not TORCH_SUPPORTS_MMAP:
+    print(f"[Models] MODEL_MMAP_WEIGHTS is set but needs torch >= 2.1 (installed: {torch.__version__}); "
+          f"memory-mapped weights are OFF and each worker keeps its own copy")
+MODEL_MMAP_ACTIVE = MODEL_MMAP_WEIGHTS and TORCH_SUPPORTS_MMAP
+
+# Audio inference backend: "torch" (eager PyTorch), "onnx" (ONNX Runtime fp32) or "onnx-int8" (dynamic int8)
+AUDIO_BACKEND = os.environ.get("AUDIO_BACKEND", "torch")
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "onnx_models")  # written by `python FVATool.py export-onnx`
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))  # 0 = onnxruntime default
+
+# Micro-batching of concurrent audio inference requests
+INFER_MAX_BATCH_SIZE = int(os.environ.get("INFER_MAX_BATCH_SIZE", "8"))  # max clips per forward pass
+INFER_MAX_WAIT_MS = float(os.environ.get("INFER_MAX_WAIT_MS", "5"))  # how long the first request waits for company
+INFER_MAX_PAD_RATIO = float(os.environ.get("INFER_MAX_PAD_RATIO", "1.5"))  # longest/shortest clip allowed in one batch
+
+# Long recordings are analysed as overlapping windows instead of one huge sequence
+LONG_AUDIO_WINDOW_S = float(os.environ.get("LONG_AUDIO_WINDOW_S", "5.0"))
+LONG_AUDIO_HOP_S = float(os.environ.get("LONG_AUDIO_HOP_S", "2.5"))
+LONG_AUDIO_AUTO_S = float(os.environ.get("LONG_AUDIO_AUTO_S", "60"))  # switch to windows above this duration; 0 = only on request
+LONG_AUDIO_GROUP_SIZE = int(os.environ.get("LONG_AUDIO_GROUP_SIZE", str(INFER_MAX_BATCH_SIZE)))  # windows in flight at once
+
+# Voice activity detection: only speech regions (plus padding) reach the emotion model
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "1") == "1"  # default for requests without a `vad` param
+VAD_FRAME_MS = 30
+VAD_PAD_MS = float(os.environ.get("VAD_PAD_MS", "200"))  # audio kept on both sides of each speech region
+VAD_MIN_SPEECH_MS = float(os.environ.get("VAD_MIN_SPEECH_MS", "120"))  # shorter bursts count as noise
+VAD_ENERGY_FLOOR_DB = float(os.environ.get("VAD_ENERGY_FLOOR_DB", "-50"))  # frames quieter than this (dBFS) are silence
+VAD_SNR_DB = float(os.environ.get("VAD_SNR_DB", "6"))  # speech must be this far above the clip's noise floor
+VAD_MAX_FLATNESS = float(os.environ.get("VAD_MAX_FLATNESS", "0.5"))  # flatter (noise-like) frames are not speech
+VAD_BLOCK_FRAMES = 4096  # frames analysed per block; bounds memory on long clips
+
+# Acoustic feature profiles (see FEATURE_PROFILES): "live" | "standard" | "full"
+FEATURE_PROFILE = os.environ.get("FEATURE_PROFILE", "full").lower()  # /infer and the audio track of videos
+# /infer_chunk and /stream. "full" keeps their original output; the cheaper "live" profile (no tempo, so
+# voice_quality.speech_rate is "unknown") is opt-in per request (profile=live) or via this variable
+FEATURE_PROFILE_LIVE = os.environ.get("FEATURE_PROFILE_LIVE", "full").lower()
+
+# CPU allocation per worker process. Keep TORCH_NUM_THREADS + DSP_WORKERS at or below
+# the cores available to one gunicorn worker so model and DSP threads do not thrash.
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0"))  # intra-op threads for inference (0 = torch default)
+TORCH_INTEROP_THREADS = int(os.environ.get("TORCH_INTEROP_THREADS", "0"))  # inter-op threads (0 = torch default)
+DSP_WORKERS = int(os.environ.get("DSP_WORKERS", "0"))  # processes for decoding + features (0 = inline on the request thread)
+
+# In-memory audio decoding
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN") or shutil.which("ffmpeg")  # used for webm/opus/mp4 uploads
+FFMPEG_TIMEOUT_S = float(os.environ.get("FFMPEG_TIMEOUT_S", "30"))
+
+# Live streaming over /stream (WebSocket, needs flask-sock)
+STREAM_UPDATE_MS = int(os.environ.get("STREAM_UPDATE_MS", "1000"))  # default cadence of pushed updates
+STREAM_MIN_UPDATE_MS = 250  # clients cannot ask for updates more often than this
+STREAM_MIN_NEW_AUDIO_S = 0.25  # hold an update until at least this much new audio has arrived
+STREAM_MAX_MESSAGE_BYTES = 1024 * 1024
+
+# Video sampling / detection batching
+VIDEO_BATCH_SIZE = int(os.environ.get("VIDEO_BATCH_SIZE", "4"))  # sampled frames per YOLO call
+FRAME_BATCH_MAX = int(os.environ.get("FRAME_BATCH_MAX", "16"))  # frames per /infer_frames request (and per YOLO call)
+
+# Asynchronous /infer_video jobs (async=1)
+VIDEO_JOB_WORKERS = int(os.environ.get("VIDEO_JOB_WORKERS", "1"))  # videos processed concurrently per worker process
+VIDEO_JOB_MAX_QUEUED = int(os.environ.get("VIDEO_JOB_MAX_QUEUED", "4"))  # waiting jobs per worker process before 429
+VIDEO_JOB_DIR = os.environ.get("VIDEO_JOB_DIR", os.path.join(tempfile.gettempdir(), "fvatool_jobs"))  # shared by all workers
+VIDEO_JOB_TTL_S = float(os.environ.get("VIDEO_JOB_TTL_S", "3600"))  # finished jobs and their results are kept this long
+VIDEO_SEEK_MIN_SKIP = int(os.environ.get("VIDEO_SEEK_MIN_SKIP", "0"))  # seek instead of grab when frame_skip >= this (0 = never)
+# Motion-adaptive sampling (detect mode): candidates are read at VIDEO_MAX_FPS, near-duplicates of the last
+# detected frame skip YOLO, and at least VIDEO_MIN_FPS frames reach the detector. YOLO calls stay within the
+# fixed duration tier's budget on average, so bursts of motion are sampled densely and static stretches pay for them
+VIDEO_SAMPLING = os.environ.get("VIDEO_SAMPLING", "adaptive").lower()  # adaptive | fixed (duration tiers only)
+VIDEO_MIN_FPS = float(os.environ.get("VIDEO_MIN_FPS", "1.0"))
+VIDEO_MAX_FPS = float(os.environ.get("VIDEO_MAX_FPS", "5.0"))
+VIDEO_MOTION_THRESHOLD = float(os.environ.get("VIDEO_MOTION_THRESHOLD", "3.0"))  # mean abs gray diff on a 64x36 thumbnail
+
+# Content-addressed result cache for /infer, /infer_frame and /infer_video
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "256"))  # 0 disables the cache
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # serialized size of the memory tier
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "")  # optional on-disk tier (empty = memory only)
+RESULT_CACHE_TTL_S = float(os.environ.get("RESULT_CACHE_TTL_S", "3600"))  # expiry of on-disk entries
+
+# Keyframe tracking mode for /infer_video (mode=track)
+TRACKER_KEYFRAME_INTERVAL = int(os.environ.get("TRACKER_KEYFRAME_INTERVAL", "5"))  # sampled frames between full detections
+TRACKER_IOU_THRESHOLD = float(os.environ.get("TRACKER_IOU_THRESHOLD", "0.3"))
+TRACKER_MAX_MISSES = int(os.environ.get("TRACKER_MAX_MISSES", "2"))  # unmatched keyframes before a track is closed
+TRACKER_MOTION_THRESHOLD = float(os.environ.get("TRACKER_MOTION_THRESHOLD", "12.0"))  # mean abs gray diff forcing a keyframe
 
 # -----------------------
 # Init
 # -----------------------
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app) if Sock is not None else None
 
-print("Loading audio model & processor (may take a while)...")
-audio_model = Wav2Vec2ForSequenceClassification.from_pretrained(MODEL_NAME)
-audio_processor = Wav2Vec2FeatureExtractor.from_pretrained(MODEL_NAME)
-audio_model.eval()
-
-print("Loading video model (may take a while)...")
+audio_model = None  # PyTorch model; stays None when an ONNX backend is selected
+audio_processor = None
+audio_engine = None  # backend that actually runs the forward pass
 video_model = None
-if os.path.exists(VIDEO_MODEL_PATH):
-    try:
-        # Try loading with different methods for compatibility
+# The Ultralytics predictor (setup, batch, results) is not thread-safe, and the model is shared by
+# request threads (gthread workers) and video job threads; every call goes through run_video_model()
+VIDEO_MODEL_LOCK = threading.Lock()
+
+# Per-model load state, reported by /health and /health/ready
+MODEL_STATUS = {
+    "audio": {"state": "pending", "load_time_ms": None, "warmup_ms": None, "error": None},
+    "video": {"state": "pending", "load_time_ms": None, "warmup_ms": None, "error": None}
+}
+_model_settled = {"audio": threading.Event(), "video": threading.Event()}  # set once loading finished, ok or not
+_model_loader_lock = threading.Lock()
+_model_loader_thread = None
+
+def _weights_fingerprint(state: Dict[str, torch.Tensor]) -> str:
+    """Names, shapes, dtypes and leading values of every tensor: changes whenever the checkpoint does."""
+    digest = hashlib.sha1()
+    for key, tensor in state.items():
+        digest.update(f"{key}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        digest.update(tensor.detach().reshape(-1)[:64].float().cpu().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def _mmap_weights(module: torch.nn.Module, name: str) -> torch.nn.Module:
+    """
+    Re-point a module's parameters and buffers at a memory-mapped copy of its state_dict.
+    The weights then sit in clean, file-backed page-cache pages that every process on the
+    host (gunicorn workers, DSP pool) shares, instead of private anonymous memory.
+    """
+    state = module.state_dict()
+    path = os.path.join(MODEL_MMAP_DIR, f"{name}-{_weights_fingerprint(state)}.pt")
+    if not os.path.exists(path):
+        os.makedirs(MODEL_MMAP_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)  # atomic, so concurrently starting workers never map a partial file
+    del state
+    module.load_state_dict(torch.load(path, mmap=True, weights_only=True), assign=True)
+    print(f"[Models] {name} weights memory-mapped from {path}")
+    return module
+
+def _load_torch_audio_model():
+    # Imported here so importing this module (and answering /health) does not wait on transformers
+    from transformers import Wav2Vec2ForSequenceClassification
+    model = Wav2Vec2ForSequenceClassification.from_pretrained(MODEL_NAME)
+    model.eval()
+    if MODEL_MMAP_ACTIVE:
         try:
-            # Method 1: Standard YOLO loading
-            video_model = YOLO(VIDEO_MODEL_PATH)
-            print(f"Video model loaded successfully from {VIDEO_MODEL_PATH}")
-        except Exception as e1:
-            error_msg = str(e1)
-            print(f"Standard YOLO load failed: {error_msg}")
-            
-            # Check if it's a C3k2 or custom architecture error
-            if "C3k2" in error_msg or "attribute" in error_msg.lower():
-                print("\n" + "="*60)
-                print("MODEL COMPATIBILITY ISSUE DETECTED")
-                print("="*60)
-                print("Your best.pt model was trained with a custom architecture")
-                print("that includes 'C3k2' module, which is not in the current ultralytics version.")
-                print("\nSOLUTIONS:")
-                print("1. Use the same ultralytics version that trained the model")
-                print("2. Or export/re-save the model in a compatible format")
-                print("3. Or train a new model with the current ultralytics version")
-                print("\nThe application will continue without video analysis.")
-                print("Audio analysis will still work normally.")
-                print("="*60 + "\n")
-            else:
-                # Try alternative loading methods
-                try:
-                    # Method 2: Load with explicit task
-                    video_model = YOLO(VIDEO_MODEL_PATH, task='detect')
-                    print(f"Video model loaded with explicit task from {VIDEO_MODEL_PATH}")
-                except Exception as e2:
-                    print(f"Explicit task load also failed: {e2}")
-                    print("Video analysis will be unavailable")
+            _mmap_weights(model, "audio")
+        except Exception as e:
+            print(f"[Models] Could not memory-map audio weights, keeping them in memory: {e}")
+    return model
+
+def _load_audio_model():
+    global audio_model, audio_processor, audio_engine
+    from transformers import Wav2Vec2FeatureExtractor
+    print(f"Loading audio model & processor with the {AUDIO_BACKEND} backend (may take a while)...")
+    processor = Wav2Vec2FeatureExtractor.from_pretrained(MODEL_NAME)
+    if AUDIO_BACKEND == "torch":
+        audio_model = _load_torch_audio_model()
+        engine = TorchAudioBackend(audio_model)
+    elif AUDIO_BACKEND in ("onnx", "onnx-int8"):
+        # The PyTorch weights are never loaded here, which is where the RSS saving comes from
+        engine = OnnxAudioBackend(onnx_model_path(quantized=AUDIO_BACKEND == "onnx-int8"), AUDIO_BACKEND)
+    else:
+        raise ValueError(f"Unknown AUDIO_BACKEND '{AUDIO_BACKEND}' (expected torch, onnx or onnx-int8)")
+    audio_processor, audio_engine = processor, engine
+    return True
+
+def _load_video_model():
+    """Load best.pt with the compatibility fallbacks; returns False when video analysis is unavailable."""
+    global video_model
+    from ultralytics import YOLO
+    print("Loading video model (may take a while)...")
+    model = None
+    if os.path.exists(VIDEO_MODEL_PATH):
+        try:
+            # Try loading with different methods for compatibility
+            try:
+                # Method 1: Standard YOLO loading
+                model = YOLO(VIDEO_MODEL_PATH)
+                print(f"Video model loaded successfully from {VIDEO_MODEL_PATH}")
+            except Exception as e1:
+                error_msg = str(e1)
+                print(f"Standard YOLO load failed: {error_msg}")
+                
+                # Check if it's a C3k2 or custom architecture error
+                if "C3k2" in error_msg or "attribute" in error_msg.lower():
+                    print("\n" + "="*60)
+                    print("MODEL COMPATIBILITY ISSUE DETECTED")
+                    print("="*60)
+                    print("Your best.pt model was trained with a custom architecture")
+                    print("that includes 'C3k2' module, which is not in the current ultralytics version.")
+                    print("\nSOLUTIONS:")
+                    print("1. Use the same ultralytics version that trained the model")
+                    print("2. Or export/re-save the model in a compatible format")
+                    print("3. Or train a new model with the current ultralytics version")
+                    print("\nThe application will continue without video analysis.")
+                    print("Audio analysis will still work normally.")
+                    print("="*60 + "\n")
+                else:
+                    # Try alternative loading methods
+                    try:
+                        # Method 2: Load with explicit task
+                        model = YOLO(VIDEO_MODEL_PATH, task='detect')
+                        print(f"Video model loaded with explicit task from {VIDEO_MODEL_PATH}")
+                    except Exception as e2:
+                        print(f"Explicit task load also failed: {e2}")
+                        print("Video analysis will be unavailable")
+        except Exception as e:
+            print(f"Warning: Could not load video model: {e}")
+            print("Video analysis will be unavailable")
+            import traceback
+            traceback.print_exc()
+    else:
+        print(f"Warning: Video model file {VIDEO_MODEL_PATH} not found. Video analysis will be unavailable.")
+    if model is not None and MODEL_MMAP_ACTIVE:
+        try:
+            # Fuse conv+bn now: the predictor would otherwise fuse lazily into fresh private tensors per worker
+            model.fuse()
+            _mmap_weights(model.model, "video")
+        except Exception as e:
+            print(f"[Models] Could not memory-map video weights, keeping them in memory: {e}")
+    video_model = model
+    return model is not None
+
+def _warmup_audio():
+    # One dummy clip through the batcher + feature engine so the first request skips lazy init
+    dummy = (0.01 * np.random.default_rng(0).standard_normal(BUFFER_SR)).astype(np.float32)
+    AUDIO_BATCHER.submit(dummy, BUFFER_SR)
+    compute_basic_audio_features(dummy, BUFFER_SR)
+    FEATURE_COSTS.clear()  # the first pass includes lazy init; measure every profile again warm
+    for profile in FEATURE_PROFILES:
+        compute_basic_audio_features(dummy, BUFFER_SR, profile)
+
+def run_video_model(source, conf_threshold: float = None):
+    """YOLO inference on one frame or a list of frames, serialized across threads."""
+    kwargs = {} if conf_threshold is None else {"conf": conf_threshold}
+    with VIDEO_MODEL_LOCK:
+        return video_model(source, verbose=False, imgsz=640, **kwargs)
+
+def _warmup_video():
+    run_video_model(np.zeros((640, 640, 3), dtype=np.uint8))
+
+_MODEL_WARMUPS = {"audio": _warmup_audio, "video": _warmup_video}
+
+def _warmup_model(name: str):
+    status = MODEL_STATUS[name]
+    t1 = time.perf_counter()
+    try:
+        _MODEL_WARMUPS[name]()
+        status["warmup_ms"] = round((time.perf_counter() - t1) * 1000, 1)
     except Exception as e:
-        print(f"Warning: Could not load video model: {e}")
-        print("Video analysis will be unavailable")
-        import traceback
-        traceback.print_exc()
-else:
-    print(f"Warning: Video model file {VIDEO_MODEL_PATH} not found. Video analysis will be unavailable.")
+        print(f"[Models] Warmup of {name} model failed: {e}")
+
+def _load_models(warmup: bool = MODEL_WARMUP):
+    for name, loader in (("audio", _load_audio_model), ("video", _load_video_model)):
+        status = MODEL_STATUS[name]
+        status["state"] = "loading"
+        t0 = time.perf_counter()
+        try:
+            loaded = loader()
+        except Exception as e:
+            print(f"[Models] Failed to load {name} model: {e}")
+            status["error"] = str(e)
+            loaded = None
+        status["load_time_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        if loaded and warmup:
+            status["state"] = "warming_up"
+            _warmup_model(name)
+        status["state"] = "ready" if loaded else ("failed" if loaded is None else "unavailable")
+        print(f"[Models] {name} model {status['state']} in {status['load_time_ms']}ms")
+        _model_settled[name].set()
+
+def start_model_loading(background: bool = True, warmup: bool = MODEL_WARMUP):
+    """Load the models once per process, on a daemon thread unless background=False."""
+    global _model_loader_thread
+    with _model_loader_lock:
+        if _model_loader_thread is not None:
+            return
+        if not background:
+            _model_loader_thread = threading.current_thread()
+            _load_models(warmup)
+            return
+        _model_loader_thread = threading.Thread(target=_load_models, args=(warmup,), name="model-loader", daemon=True)
+        _model_loader_thread.start()
+
+def _warmup_after_fork():
+    # Runs in each forked worker: the master never ran inference, so no torch / batcher threads crossed the fork
+    if MODEL_WARMUP:
+        threading.Thread(target=lambda: [_warmup_model(name) for name, st in MODEL_STATUS.items() if st["state"] == "ready"],
+                         name="model-warmup", daemon=True).start()
+
+def preload_models():
+    """
+    Load the models synchronously in this (master) process for copy-on-write sharing.
+    Warmup is deferred to the forked workers, and gc.freeze() moves everything loaded so
+    far out of the collector's reach so that collections in the workers do not write to
+    (and un-share) those pages.
+    """
+    start_model_loading(background=False, warmup=False)
+    gc.collect()
+    gc.freeze()
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_warmup_after_fork)
+    print(f"[Models] Preloaded in pid {os.getpid()}; {gc.get_freeze_count()} objects frozen for forked workers")
+
+def wait_for_model(name: str, timeout: float = None) -> bool:
+    """Block until the model has settled (up to MODEL_WAIT_TIMEOUT_S); True if it is usable."""
+    _model_settled[name].wait(MODEL_WAIT_TIMEOUT_S if timeout is None else timeout)
+    return MODEL_STATUS[name]["state"] == "ready"
+
+def _model_not_ready_response(name: str):
+    state = MODEL_STATUS[name]["state"]
+    return _respond({
+        "success": False,
+        "error": "MODEL_LOADING" if state in ("pending", "loading", "warming_up") else "MODEL_UNAVAILABLE",
+        "message": f"{name} model is {state}",
+        "model_state": state
+    }, 503)
 
 # id2label from your model
 id2label_raw = {
@@ -94,7 +410,6 @@ id2label_raw = {
 }
 
 # rolling buffers for sessioned chunk inference
-ROLLING_BUFFERS = {}  # session_id -> deque of numpy arrays
 
 # -----------------------
 # Helpers (copied & slightly adapted)
@@ -124,46 +439,266 @@ def normalize_emotion_probs(raw_probs: Dict[str, float]) -> Dict[str, float]:
         normalized[k] = round(float(normalized[k] * 100), 2)
     return normalized
 
-def compute_basic_audio_features(y: np.ndarray, sr: int) -> Dict[str, Any]:
-    y = np.asarray(y, dtype=np.float32).flatten()
-    if y.size == 0:
-        return {"rms": 0.0, "zcr": 0.0, "spectral_flatness": 0.0, "median_f0_hz": None, "speech_rate_bpm": None}
-    rms = float(np.mean(librosa.feature.rms(y=y)))
-    zcr = float(np.mean(librosa.feature.zero_crossing_rate(y)))
-    flatness = float(np.mean(librosa.feature.spectral_flatness(y=y)))
-    f0 = None
-    try:
-        f0_candidates = librosa.yin(y, fmin=50, fmax=400, sr=sr)
-        f0_vals = f0_candidates[~np.isnan(f0_candidates)]
-        f0 = float(np.median(f0_vals)) if len(f0_vals) > 0 else None
-    except Exception:
-        f0 = None
-    speech_rate = None
+# Shared framing / STFT parameters (librosa defaults, so values match the old per-feature calls)
+FEATURE_N_FFT = 2048
+FEATURE_HOP_LENGTH = 512
+FEATURE_BLOCK_FRAMES = 1024  # frames transformed per FFT block; bounds memory on long clips
+_FEATURE_WINDOWS = {}
+_MEL_BASES = {}
+
+# Which optional estimators a profile runs, and with which algorithm (None = skipped).
+# rms / zcr / spectral_flatness come from the shared STFT and always run.
+FEATURE_PROFILES = {
+    "live": {"pitch": "autocorr", "tempo": None},
+    "standard": {"pitch": "autocorr", "tempo": "decimated"},
+    "full": {"pitch": "yin", "tempo": "onset"}
+}
+_FEATURE_FALLBACKS = {"yin": "autocorr", "onset": "decimated"}  # cheaper algorithm tried before skipping
+FEATURE_COSTS = {}  # algorithm -> EWMA seconds per second of audio, drives latency budgets
+
+def _feature_profile(name: str = None, default: str = None) -> str:
+    """Validated profile name; raises ValueError for unknown profiles."""
+    name = (name or default or FEATURE_PROFILE).lower()
+    if name not in FEATURE_PROFILES:
+        raise ValueError(f"profile must be one of {', '.join(FEATURE_PROFILES)}")
+    return name
+
+def _empty_audio_features() -> Dict[str, Any]:
+    return {"rms": 0.0, "zcr": 0.0, "spectral_flatness": 0.0, "median_f0_hz": None, "speech_rate_bpm": None}
+
+def _feature_window(n_fft: int) -> np.ndarray:
+    window = _FEATURE_WINDOWS.get(n_fft)
+    if window is None:
+        window = librosa.filters.get_window("hann", n_fft, fftbins=True).astype(np.float32)
+        _FEATURE_WINDOWS[n_fft] = window
+    return window
+
+def _mel_basis(sr: int, n_fft: int) -> np.ndarray:
+    basis = _MEL_BASES.get((sr, n_fft))
+    if basis is None:
+        basis = librosa.filters.mel(sr=sr, n_fft=n_fft).astype(np.float32)
+        _MEL_BASES[(sr, n_fft)] = basis
+    return basis
+
+def _zero_crossing_rate_frames(y: np.ndarray, n_frames: int, frame_length: int, hop_length: int) -> np.ndarray:
+    # Same as librosa.feature.zero_crossing_rate (edge padding, 1e-10 threshold) but O(n):
+    # crossings are marked once per sample and summed per frame with a cumulative sum.
+    signs = np.signbit(np.where(np.abs(y) <= 1e-10, 0.0, y))
+    pad = frame_length // 2
+    signs = np.pad(signs, (pad, pad), mode="edge")
+    crossings = np.zeros(len(signs), dtype=np.int64)
+    crossings[1:] = signs[1:] != signs[:-1]
+    cumulative = np.concatenate(([0], np.cumsum(crossings)))
+    starts = np.arange(n_frames) * hop_length
+    # The first sample of each frame has no predecessor inside the frame
+    counts = cumulative[starts + frame_length] - cumulative[starts + 1]
+    return counts / float(frame_length)
+
+def _shared_frame_features(ys: List[np.ndarray], sr: int) -> List[Dict[str, np.ndarray]]:
+    """
+    Frame every clip once and run a single STFT over all frames of the batch.
+    Per-frame RMS, spectral flatness and the mel power spectrogram are derived from
+    those shared buffers; frames from several clips share each FFT block.
+    """
+    n_fft, hop = FEATURE_N_FFT, FEATURE_HOP_LENGTH
+    pad = n_fft // 2
+    window = _feature_window(n_fft)[:, None]
+    mel_basis = _mel_basis(sr, n_fft)
+
+    framed, outputs = [], []
+    for y in ys:
+        frames = librosa.util.frame(np.pad(y, (pad, pad), mode="constant"), frame_length=n_fft, hop_length=hop)
+        n_frames = frames.shape[1]
+        framed.append(frames)
+        outputs.append({
+            "rms": np.empty(n_frames, dtype=np.float32),
+            "flatness": np.empty(n_frames, dtype=np.float32),
+            "mel": np.empty((mel_basis.shape[0], n_frames), dtype=np.float32),
+            "zcr": _zero_crossing_rate_frames(y, n_frames, n_fft, hop)
+        })
+
+    def flush(segments):
+        block = np.concatenate([framed[i][:, a:b] for i, a, b in segments], axis=1)
+        rms = np.sqrt(np.mean(block ** 2, axis=0))
+        power = np.abs(np.fft.rfft(block * window, axis=0)) ** 2
+        power_thresh = np.maximum(1e-10, power)
+        flatness = np.exp(np.mean(np.log(power_thresh), axis=0)) / np.mean(power_thresh, axis=0)
+        mel = mel_basis @ power
+        col = 0
+        for i, a, b in segments:
+            n = b - a
+            outputs[i]["rms"][a:b] = rms[col:col + n]
+            outputs[i]["flatness"][a:b] = flatness[col:col + n]
+            outputs[i]["mel"][:, a:b] = mel[:, col:col + n]
+            col += n
+
+    segments, pending = [], 0
+    for i, frames in enumerate(framed):
+        start = 0
+        while start < frames.shape[1]:
+            end = min(frames.shape[1], start + FEATURE_BLOCK_FRAMES - pending)
+            segments.append((i, start, end))
+            pending += end - start
+            start = end
+            if pending >= FEATURE_BLOCK_FRAMES:
+                flush(segments)
+                segments, pending = [], 0
+    if segments:
+        flush(segments)
+    return outputs
+
+def _pitch_yin(y: np.ndarray, sr: int, mel: np.ndarray) -> float:
+    f0_candidates = librosa.yin(y, fmin=50, fmax=400, sr=sr)
+    f0_vals = f0_candidates[~np.isnan(f0_candidates)]
+    return float(np.median(f0_vals)) if len(f0_vals) > 0 else None
+
+def _pitch_autocorr(y: np.ndarray, sr: int, mel: np.ndarray, fmin: float = 50.0, fmax: float = 400.0) -> float:
+    """
+    Median f0 from FFT autocorrelation of non-overlapping frames, after halving the
+    sample rate (fmax is far below Nyquist). Several times cheaper than yin.
+    """
+    y = y[:len(y) // 2 * 2].reshape(-1, 2).mean(axis=1)
+    sr = sr // 2
+    frame = 1 << int(np.ceil(np.log2(2 * sr / fmin)))  # two periods of the lowest pitch
+    if len(y) < frame:
+        y = np.pad(y, (0, frame - len(y)))
+    frames = y[:len(y) // frame * frame].reshape(-1, frame).T
+    frames = frames - frames.mean(axis=0)
+    ac = np.fft.irfft(np.abs(np.fft.rfft(frames, n=2 * frame, axis=0)) ** 2, axis=0)[:frame]
+    lo, hi = int(sr // fmax), int(np.ceil(sr / fmin))
+    lags = np.argmax(ac[lo:hi + 1], axis=0)
+    peak = ac[lo + lags, np.arange(ac.shape[1])] / np.maximum(ac[0], 1e-10)
+    voiced = (peak > 0.5) & (ac[0] > 1e-6)
+    return float(np.median(sr / (lo + lags[voiced]))) if voiced.any() else None
+
+def _tempo_onset(y: np.ndarray, sr: int, mel: np.ndarray) -> float:
+    # Onset envelope from the shared mel spectrogram instead of a second STFT
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr, hop_length=FEATURE_HOP_LENGTH)
+    tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=sr, hop_length=FEATURE_HOP_LENGTH)
+    return float(tempo[0]) if len(tempo) > 0 else None
+
+def _tempo_decimated(y: np.ndarray, sr: int, mel: np.ndarray) -> float:
+    # Onset envelope max-pooled to half the frame rate: the tempo autocorrelation runs on half the lags
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr, hop_length=FEATURE_HOP_LENGTH)
+    onset_env = onset_env[:len(onset_env) // 2 * 2].reshape(-1, 2).max(axis=1)
+    if len(onset_env) == 0:
+        return None
+    tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=sr, hop_length=2 * FEATURE_HOP_LENGTH)
+    return float(tempo[0]) if len(tempo) > 0 else None
+
+_FEATURE_ESTIMATORS = {
+    "pitch": ("median_f0_hz", {"yin": _pitch_yin, "autocorr": _pitch_autocorr}),
+    "tempo": ("speech_rate_bpm", {"onset": _tempo_onset, "decimated": _tempo_decimated})
+}
+
+def _budgeted_algorithm(algorithm: str, audio_s: float, deadline: float) -> str:
+    """The algorithm (or its cheaper fallback) expected to finish before deadline, else None."""
+    while algorithm is not None:
+        cost = FEATURE_COSTS.get(algorithm)
+        if deadline is None or cost is None or cost * audio_s <= deadline - time.time():
+            return algorithm
+        algorithm = _FEATURE_FALLBACKS.get(algorithm)
+    return None
+
+def compute_basic_audio_features_batch(ys: List[np.ndarray], sr: int, profile: str = None, deadline: float = None,
+                                       report: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    Vectorized compute_basic_audio_features over several clips sharing one sample rate.
+    profile picks the optional estimators (FEATURE_PROFILES); with a deadline (time.time()
+    based) an estimator whose expected cost does not fit falls back to a cheaper algorithm
+    or is skipped, leaving its feature None. report, if given, receives the profile and
+    what was downgraded or skipped. Runs in the DSP process pool when DSP_WORKERS > 0.
+    """
+    profile = _feature_profile(profile)
+    if DSP_EXECUTOR.enabled:
+        return DSP_EXECUTOR.features(ys, sr, profile, deadline, report)
+    return _compute_features_inline(ys, sr, profile, deadline, report)
+
+def _compute_features_inline(ys: List[np.ndarray], sr: int, profile: str, deadline: float = None,
+                             report: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    clips = [np.asarray(y, dtype=np.float32).reshape(-1) for y in ys]
+    results = [None] * len(clips)
+    active = [i for i, y in enumerate(clips) if y.size > 0]
+    for i in range(len(clips)):
+        if clips[i].size == 0:
+            results[i] = _empty_audio_features()
+    if report is not None:
+        report.setdefault("profile", profile)
+        report.setdefault("downgraded", {})
+        report.setdefault("skipped", [])
+    if not active:
+        return results
+
+    frame_feats = _shared_frame_features([clips[i] for i in active], sr)
+    for i, ff in zip(active, frame_feats):
+        results[i] = {
+            "rms": float(np.mean(ff["rms"])),
+            "zcr": float(np.mean(ff["zcr"])),
+            "spectral_flatness": float(np.mean(ff["flatness"])),
+            "median_f0_hz": None,
+            "speech_rate_bpm": None
+        }
+
+    audio_s = sum(clips[i].size for i in active) / float(sr)
+    for name, (key, algorithms) in _FEATURE_ESTIMATORS.items():
+        wanted = FEATURE_PROFILES[profile][name]
+        algorithm = _budgeted_algorithm(wanted, audio_s, deadline)
+        if report is not None and wanted is not None and algorithm != wanted:
+            if algorithm is None:
+                if name not in report["skipped"]:
+                    report["skipped"].append(name)
+            else:
+                report["downgraded"][name] = algorithm
+        if algorithm is None:
+            continue
+        t0 = time.perf_counter()
+        for i, ff in zip(active, frame_feats):
+            try:
+                results[i][key] = algorithms[algorithm](clips[i], sr, ff["mel"])
+            except Exception:
+                results[i][key] = None
+        per_s = (time.perf_counter() - t0) / max(audio_s, 1e-3)
+        previous = FEATURE_COSTS.get(algorithm)
+        FEATURE_COSTS[algorithm] = per_s if previous is None else 0.8 * previous + 0.2 * per_s
+    return results
+
+def compute_basic_audio_features(y: np.ndarray, sr: int, profile: str = None, deadline: float = None,
+                                 report: Dict[str, Any] = None) -> Dict[str, Any]:
+    return compute_basic_audio_features_batch([y], sr, profile, deadline, report)[0]
+
+def _feature_params(values, default_profile: str = None) -> Tuple[str, float]:
+    """profile / latency_budget_ms request params; raises ValueError when invalid."""
+    profile = _feature_profile(values.get("profile"), default_profile)
+    budget = values.get("latency_budget_ms")
     try:
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        tempo = librosa.beat.tempo(onset_envelope=onset_env, sr=sr)
-        speech_rate = float(tempo[0]) if len(tempo) > 0 else None
-    except Exception:
-        speech_rate = None
-    return {
-        "rms": rms,
-        "zcr": zcr,
-        "spectral_flatness": flatness,
-        "median_f0_hz": f0,
-        "speech_rate_bpm": speech_rate
-    }
+        budget = float(budget) if budget not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError("latency_budget_ms must be a number")
+    if budget is not None and budget <= 0:
+        raise ValueError("latency_budget_ms must be positive")
+    return profile, budget
+
+def _feature_value(audio_feats: Dict[str, Any], key: str, default: float) -> float:
+    """A feature that may be missing or None (skipped by its profile or latency budget)."""
+    value = audio_feats.get(key)
+    return default if value is None else value
+
+def _speech_rate_label(bpm: float) -> str:
+    if bpm is None:
+        return "unknown"  # tempo not estimated for this profile / budget
+    return "fast" if bpm > 160 else "normal" if bpm > 80 else "slow"
 
 def derive_health_metrics(normalized_emotions: Dict[str, float], audio_feats: Dict[str, Any], primary_emotion: str = None) -> Dict[str, Any]:
     stressed_pct = normalized_emotions.get("stressed", 0.0)
-    flatness = audio_feats.get("spectral_flatness", 0.0)
+    flatness = _feature_value(audio_feats, "spectral_flatness", 0.0)
     stress_level = clamp(stressed_pct + (flatness * 100) * 0.4)
-    rms = audio_feats.get("rms", 0.0)
+    rms = _feature_value(audio_feats, "rms", 0.0)
     energy_from_rms = clamp((rms / 0.08) * 100)
     happy_pct = normalized_emotions.get("happy", 0.0)
     calm_pct = normalized_emotions.get("calm", 0.0)
     energy_level = clamp((energy_from_rms * 0.6) + ((happy_pct + calm_pct) * 0.2))
     hydration_level = 55.0
-    zcr = audio_feats.get("zcr", 0.0)
+    zcr = _feature_value(audio_feats, "zcr", 0.0)
     clarity = clamp((1.0 - zcr) * 100 - (flatness * 30) + (energy_from_rms * 0.1))
     tired_pct = normalized_emotions.get("tired", 0.0)
     fatigue_detected = (stress_level > 65) or (energy_level < 35) or (tired_pct > 40)
@@ -207,7 +742,7 @@ def derive_health_metrics(normalized_emotions: Dict[str, float], audio_feats: Di
         "voice_quality": {
             "clarity": round(float(clarity), 2),
             "volume_consistency": round(float(min(100, max(0, energy_from_rms))), 2),
-            "speech_rate": ("fast" if (audio_feats.get("speech_rate_bpm") or 0) > 160 else "normal" if (audio_feats.get("speech_rate_bpm") or 0) > 80 else "slow")
+            "speech_rate": _speech_rate_label(audio_feats.get("speech_rate_bpm"))
         },
         "health_indicators": {
             "breathing_rate": "normal",
@@ -237,17 +772,1513 @@ def generate_recommendations(metrics: Dict[str, Any], normalized_emotions: Dict[
     return recs
 
 # -----------------------
-# Core processing - EXACTLY matching original Gradio code
+# Metrics (Prometheus text format)
 # -----------------------
-# classify_audio function kept for reference - actual processing now in _process_array_and_build_response
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS_S):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, series in items:
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, label_values))
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+REQUEST_LATENCY = Histogram("fvatool_request_duration_seconds", "End-to-end request latency per endpoint.", ("endpoint", "status"))
+STAGE_LATENCY = Histogram("fvatool_stage_duration_seconds", "Latency of individual pipeline stages.", ("stage",))
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, stage)
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one pipeline stage (upload_save, decode, feature_extraction, ...)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0)
+
+ACTIVE_REQUESTS = {"count": 0}  # short-lived requests being served by this process right now
+_active_requests_lock = threading.Lock()
+# Open for minutes at a time, so counting them would make the batcher think it always has company
+LONG_LIVED_ENDPOINTS = ("stream",)
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    if request.endpoint not in LONG_LIVED_ENDPOINTS:
+        g.counted_active = True
+        with _active_requests_lock:
+            ACTIVE_REQUESTS["count"] += 1
+
+@app.teardown_request
+def _finish_request(exc=None):
+    if g.pop("counted_active", False):
+        with _active_requests_lock:
+            ACTIVE_REQUESTS["count"] = max(0, ACTIVE_REQUESTS["count"] - 1)
+
+@app.after_request
+def _record_request_latency(response):
+    started = getattr(g, "request_started", None)
+    if started is not None and request.endpoint not in (None, "metrics", "static"):
+        REQUEST_LATENCY.observe(time.perf_counter() - started, request.endpoint, str(response.status_code))
+    return response
+
+def _gauge(name: str, help_text: str, samples: List[Tuple[str, float]], metric_type: str = "gauge") -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+    return lines
+
+# -----------------------
+# Audio decoding (in-memory, no temp files)
+# -----------------------
+# Formats libsndfile can read straight from a BytesIO
+SOUNDFILE_FORMATS = ("wav", "flac", "ogg", "opus", "mp3")
+# Containers that need a seekable input (moov atom may sit at the end) and so must go to disk
+SEEKABLE_ONLY_FORMATS = ("mp4", "m4a", "mov", "aac")
+
+DECODE_STATS = {}  # format -> aggregated decode timings
+_decode_stats_lock = threading.Lock()
+
+def sniff_audio_format(data: bytes, filename: str = None) -> str:
+    """Guess the container from magic bytes, falling back to the file extension."""
+    head = data[:64]
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"OggS":
+        return "opus" if b"OpusHead" in head else "ogg"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0):
+        return "mp3"
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return ext or "unknown"
 
-def _process_array_and_build_response(y: np.ndarray, sr: int, start_ts: float = None) -> Dict[str, Any]:
+def _record_decode_stats(info: Dict[str, Any]):
+    with _decode_stats_lock:
+        stats = DECODE_STATS.setdefault(info["format"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "methods": {}})
+        stats["count"] += 1
+        stats["total_ms"] += info["total_ms"]
+        stats["max_ms"] = max(stats["max_ms"], info["total_ms"])
+        stats["methods"][info["method"]] = stats["methods"].get(info["method"], 0) + 1
+
+def decode_stats_summary() -> Dict[str, Any]:
+    with _decode_stats_lock:
+        return {
+            fmt: {
+                "count": s["count"],
+                "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                "max_ms": round(s["max_ms"], 2),
+                "methods": dict(s["methods"])
+            }
+            for fmt, s in DECODE_STATS.items()
+        }
+
+def _decode_with_soundfile(data: bytes) -> Tuple[np.ndarray, int]:
+    y, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    return y.mean(axis=1), sr
+
+def _decode_with_ffmpeg_pipe(data: bytes, target_sr: int) -> Tuple[np.ndarray, int]:
+    # ffmpeg downmixes and resamples in the same pass, so no librosa.resample afterwards
+    proc = subprocess.run(
+        [FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error",
+         "-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", str(target_sr), "pipe:1"],
+        input=data,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=FFMPEG_TIMEOUT_S,
+        check=False
+    )
+    if proc.returncode != 0 or not proc.stdout:
+        raise ValueError(f"ffmpeg decode failed: {proc.stderr.decode('utf-8', 'replace').strip()[-300:]}")
+    return np.frombuffer(proc.stdout, dtype=np.float32).copy(), target_sr
+
+def _decode_with_tempfile(data: bytes, fmt: str, target_sr: int) -> Tuple[np.ndarray, int]:
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{fmt}" if fmt != "unknown" else ".bin") as tmp:
+            tmp_name = tmp.name
+            tmp.write(data)
+        y, sr = librosa.load(tmp_name, sr=target_sr, mono=True)
+        return y, sr
+    finally:
+        try:
+            if tmp_name and os.path.exists(tmp_name):
+                os.remove(tmp_name)
+        except Exception:
+            pass
+
+def decode_audio_bytes(data: bytes, filename: str = None, target_sr: int = BUFFER_SR) -> Tuple[np.ndarray, int, Dict[str, Any]]:
     """
-    Process audio array and build response - now uses EXACT original logic
+    Decode an uploaded audio payload straight from memory.
+    WAV/FLAC/OGG/MP3 go through soundfile on a BytesIO, webm/opus through an ffmpeg pipe;
+    only containers that need seeking (or a failed in-memory decode) spill to a temp file.
+    Runs in the DSP process pool when DSP_WORKERS > 0.
+    Returns (mono float32 signal at target_sr, target_sr, decode timing info).
     """
-    if start_ts is None:
-        start_ts = time.time()
-    
+    if not data:
+        raise ValueError("Audio payload is empty")
+    if DSP_EXECUTOR.enabled:
+        y, sr, info = DSP_EXECUTOR.decode(data, filename, target_sr)
+    else:
+        y, sr, info = _decode_audio_bytes_inline(data, filename, target_sr)
+    observe_stage("decode", info["read_ms"] / 1000.0)
+    observe_stage("resample", info["resample_ms"] / 1000.0)
+    _record_decode_stats(info)
+    return y, sr, info
+
+def _decode_audio_bytes_inline(data: bytes, filename: str = None, target_sr: int = BUFFER_SR) -> Tuple[np.ndarray, int, Dict[str, Any]]:
+    if not data:
+        raise ValueError("Audio payload is empty")
+    t0 = time.perf_counter()
+    fmt = sniff_audio_format(data, filename)
+    y, sr, method = None, None, None
+    errors = []
+
+    if fmt in SOUNDFILE_FORMATS or fmt == "unknown":
+        try:
+            y, sr = _decode_with_soundfile(data)
+            method = "soundfile"
+        except Exception as e:
+            errors.append(f"soundfile: {e!r}")
+    if y is None and FFMPEG_BIN and fmt not in SEEKABLE_ONLY_FORMATS:
+        try:
+            y, sr = _decode_with_ffmpeg_pipe(data, target_sr)
+            method = "ffmpeg_pipe"
+        except Exception as e:
+            errors.append(f"ffmpeg: {e!r}")
+    if y is None:
+        try:
+            y, sr = _decode_with_tempfile(data, fmt, target_sr)
+            method = "tempfile"
+        except Exception as e:
+            errors.append(f"librosa: {e!r}")
+            raise ValueError(f"Could not decode {fmt} audio: {'; '.join(errors)}")
+    t_read = time.perf_counter()
+
+    if sr != target_sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+        sr = target_sr
+    y = np.ascontiguousarray(y, dtype=np.float32).reshape(-1)
+    t_done = time.perf_counter()
+
+    info = {
+        "format": fmt,
+        "method": method,
+        "bytes": len(data),
+        "read_ms": round((t_read - t0) * 1000, 2),
+        "resample_ms": round((t_done - t_read) * 1000, 2),
+        "total_ms": round((t_done - t0) * 1000, 2)
+    }
+    return y, sr, info
+
+def _read_audio_payload(default_name: str):
+    """Return (bytes, filename) from a multipart 'audio' file or 'audio_base64' form field."""
+    if "audio" in request.files:
+        audio_file = request.files["audio"]
+        return audio_file.read(), audio_file.filename or default_name
+    b64 = request.form.get("audio_base64")
+    if b64:
+        if b64.startswith("data:"):
+            b64 = b64.split(",", 1)[1]
+        return base64.b64decode(b64), None
+    return None, None
+
+class StreamingAudioDecoder:
+    """
+    Incremental decoder for /stream. Raw PCM (s16le / f32le) is reinterpreted in place
+    and, at other rates, run through one stateful soxr stream, so frame boundaries do not
+    restart the filter; webm/ogg (opus) frames are fed to one long-lived ffmpeg process
+    (which resamples itself) whose PCM output is collected on a reader thread.
+    """
+
+    PCM_DTYPES = {"s16le": np.int16, "f32le": np.float32}
+    CONTAINER_FORMATS = ("webm", "ogg")
+
+    def __init__(self, fmt: str, sample_rate: int, target_sr: int = BUFFER_SR):
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.target_sr = target_sr
+        self._pending = b""  # PCM bytes that did not fill a whole sample yet
+        self._proc = None
+        self._resampler = None
+        if fmt in self.PCM_DTYPES:
+            self._dtype = np.dtype(self.PCM_DTYPES[fmt])
+            if sample_rate != target_sr:
+                self._resampler = soxr.ResampleStream(sample_rate, target_sr, 1, dtype="float32")
+        elif fmt in self.CONTAINER_FORMATS:
+            if not FFMPEG_BIN:
+                raise ValueError(f"streaming {fmt} needs ffmpeg on the server; send s16le or f32le PCM instead")
+            self._proc = subprocess.Popen(
+                [FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error",
+                 "-f", fmt, "-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", str(target_sr), "pipe:1"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+            )
+            self._decoded = queue.Queue()
+            self._reader = threading.Thread(target=self._read_ffmpeg, name="stream-ffmpeg", daemon=True)
+            self._reader.start()
+        else:
+            raise ValueError(f"unsupported stream format '{fmt}' (use s16le, f32le, webm or ogg)")
+
+    def _read_ffmpeg(self):
+        leftover = b""
+        while True:
+            block = self._proc.stdout.read(16384)
+            if not block:
+                break
+            block = leftover + block
+            usable = len(block) - len(block) % 4
+            leftover = block[usable:]
+            if usable:
+                self._decoded.put(np.frombuffer(block[:usable], dtype=np.float32).copy())
+
+    def _drain(self) -> np.ndarray:
+        parts = []
+        while True:
+            try:
+                parts.append(self._decoded.get_nowait())
+            except queue.Empty:
+                break
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    def feed(self, data: bytes) -> np.ndarray:
+        """Decode one frame; returns whatever mono float32 audio at target_sr is ready (possibly none)."""
+        if self._proc is not None:
+            self._proc.stdin.write(data)
+            return self._drain()
+        data = self._pending + data
+        usable = len(data) - len(data) % self._dtype.itemsize
+        self._pending = data[usable:]
+        y = np.frombuffer(data[:usable], dtype=self._dtype)
+        if self._dtype == np.int16:
+            y = y.astype(np.float32) / 32768.0
+        else:
+            y = y.astype(np.float32)
+        if self._resampler is not None:
+            y = self._resampler.resample_chunk(y)
+        return y
+
+    def close(self) -> np.ndarray:
+        """Flush the decoder and release ffmpeg; returns any audio still buffered."""
+        if self._proc is None:
+            if self._resampler is not None:
+                return self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            return np.zeros(0, dtype=np.float32)
+        try:
+            self._proc.stdin.close()
+            self._reader.join(timeout=FFMPEG_TIMEOUT_S)
+        finally:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+        return self._drain()
+
+# -----------------------
+# DSP process pool
+# -----------------------
+def _is_pool_child() -> bool:
+    # Pool processes import this module to unpickle their tasks; they must not load models
+    return __name__ == "__mp_main__" or multiprocessing.current_process().name != "MainProcess"
+
+def _to_shared(data) -> shared_memory.SharedMemory:
+    """Copy bytes or a contiguous array into a new shared memory block (closed by the caller)."""
+    view = memoryview(data).cast("B")
+    shm = shared_memory.SharedMemory(create=True, size=max(1, view.nbytes))
+    shm.buf[:view.nbytes] = view
+    return shm
+
+def _release_shm(shm: shared_memory.SharedMemory, unlink: bool = False):
+    """Close (and optionally unlink) a block without masking an exception already in flight."""
+    try:
+        shm.close()
+    except BufferError as e:
+        # A view is still alive (e.g. held by a traceback); the mapping goes when it is collected
+        print(f"[DSP] Could not close shared memory {shm.name}: {e}")
+    if unlink:
+        try:
+            shm.unlink()
+        except OSError as e:
+            print(f"[DSP] Could not unlink shared memory {shm.name}: {e}")
+
+def _dsp_worker_init():
+    # One thread per DSP process: parallelism comes from the pool, not from BLAS/OpenMP inside it
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+
+def _dsp_decode_task(shm_name: str, size: int, filename: str, target_sr: int) -> Tuple[str, int, int, Dict[str, Any]]:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = bytes(shm.buf[:size])
+    finally:
+        _release_shm(shm)
+    y, sr, info = _decode_audio_bytes_inline(data, filename, target_sr)
+    out = _to_shared(y)
+    out.close()  # the parent copies the signal out and unlinks the block
+    return out.name, len(y), sr, info
+
+def _dsp_features_task(shm_name: str, lengths: List[int], sr: int, profile: str, deadline: float,
+                       costs: Dict[str, float]) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, float]]:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    flat = ys = None
+    try:
+        flat = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+        offsets = np.cumsum([0] + list(lengths))
+        ys = [flat[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+        # Budget decisions use the parent's cost estimates; updated estimates go back with the result
+        FEATURE_COSTS.clear()
+        FEATURE_COSTS.update(costs)
+        report = {}
+        results = _compute_features_inline(ys, sr, profile, deadline, report)
+        return results, report, dict(FEATURE_COSTS)
+    finally:
+        del flat, ys  # views into shm.buf must be gone before close()
+        _release_shm(shm)
+
+class DspExecutor:
+    """
+    Runs CPU-bound DSP (upload decoding, acoustic features) in a pool of worker
+    processes so concurrent requests do not serialize on the GIL. Signals cross the
+    process boundary through multiprocessing.shared_memory; only small dicts are
+    pickled. With workers=0 (or inside a pool process) callers run the work inline.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(0, int(workers))
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {"tasks": 0, "inflight": 0, "pool_restarts": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0 and not _is_pool_child()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Pools do not survive fork (gunicorn workers), so each process starts its own.
+        # spawn, not fork: forking a process with torch / batcher threads can deadlock.
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_dsp_worker_init)
+                self._pid = pid
+            return self._executor
+
+    def _call(self, task, *args):
+        with self._lock:
+            self._stats["tasks"] += 1
+            self._stats["inflight"] += 1
+        try:
+            return self._pool().submit(task, *args).result()
+        except BrokenProcessPool:
+            # A pool process died (OOM kill, crash); the next call starts a fresh pool
+            with self._lock:
+                self._executor = None
+                self._stats["pool_restarts"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["inflight"] -= 1
+
+    def decode(self, data: bytes, filename: str, target_sr: int) -> Tuple[np.ndarray, int, Dict[str, Any]]:
+        shm = _to_shared(data)
+        try:
+            out_name, length, sr, info = self._call(_dsp_decode_task, shm.name, len(data), filename, target_sr)
+        except BrokenProcessPool:
+            return _decode_audio_bytes_inline(data, filename, target_sr)
+        finally:
+            _release_shm(shm, unlink=True)
+        out = shared_memory.SharedMemory(name=out_name)
+        view = None
+        try:
+            view = np.ndarray((length,), dtype=np.float32, buffer=out.buf)
+            y = view.copy()
+        finally:
+            del view
+            _release_shm(out, unlink=True)
+        return y, sr, info
+
+    def features(self, ys: List[np.ndarray], sr: int, profile: str, deadline: float = None,
+                 report: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        clips = [np.asarray(y, dtype=np.float32).reshape(-1) for y in ys]
+        lengths = [len(y) for y in clips]
+        shm = shared_memory.SharedMemory(create=True, size=max(1, 4 * sum(lengths)))
+        flat = None
+        try:
+            flat = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+            if clips:
+                np.concatenate(clips, out=flat)
+            results, child_report, costs = self._call(_dsp_features_task, shm.name, lengths, sr, profile, deadline,
+                                                      dict(FEATURE_COSTS))
+        except BrokenProcessPool:
+            return _compute_features_inline(ys, sr, profile, deadline, report)
+        finally:
+            del flat
+            _release_shm(shm, unlink=True)
+        FEATURE_COSTS.update(costs)
+        if report is not None:
+            report.setdefault("profile", child_report["profile"])
+            report.setdefault("downgraded", {}).update(child_report["downgraded"])
+            skipped = report.setdefault("skipped", [])
+            skipped.extend(name for name in child_report["skipped"] if name not in skipped)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"workers": self.workers if self.enabled else 0, **self._stats}
+
+DSP_EXECUTOR = DspExecutor(DSP_WORKERS)
+
+TORCH_THREADS = {"intra_op": None, "inter_op": None}  # as seen by the inference thread, reported by /health
+
+def _configure_torch_threads():
+    """
+    Apply TORCH_NUM_THREADS / TORCH_INTEROP_THREADS; called from the inference thread
+    before its first batch (with the OpenMP backend the intra-op setting is per thread).
+    """
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError as e:  # only allowed before any inter-op work has started in this process
+            print(f"[Torch] Could not set inter-op threads: {e}")
+    TORCH_THREADS.update(intra_op=torch.get_num_threads(), inter_op=torch.get_num_interop_threads())
+    print(f"[Torch] intra-op threads: {TORCH_THREADS['intra_op']}, inter-op threads: {TORCH_THREADS['inter_op']}")
+
+# -----------------------
+# Rolling session audio (ring buffers)
+# -----------------------
+def _ring_write(data: np.ndarray, capacity: int, pos: int, chunk: np.ndarray) -> int:
+    """Write chunk (at most capacity samples) into a double-written ring at pos; returns the new write position."""
+    n = len(chunk)
+    first = min(n, capacity - pos)
+    data[pos:pos + first] = chunk[:first]
+    data[capacity + pos:capacity + pos + first] = chunk[:first]
+    rest = n - first
+    if rest:
+        data[:rest] = chunk[first:]
+        data[capacity:capacity + rest] = chunk[first:]
+    return (pos + n) % capacity
+
+
+class RollingAudioBuffer:
+    """
+    Fixed-capacity float32 ring buffer holding the last `capacity` samples of a session.
+    Every sample is written twice (at pos and pos + capacity), so the most recent window
+    is always one contiguous slice: appends cost O(len(chunk)), eviction is O(1) and
+    nothing is reallocated after construction.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._data = np.zeros(2 * self.capacity, dtype=np.float32)
+        self._write_pos = 0  # next write index in [0, capacity)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def append(self, chunk: np.ndarray):
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        cap = self.capacity
+        if len(chunk) > cap:
+            chunk = chunk[-cap:]
+        n = len(chunk)
+        if n == 0:
+            return
+        with self._lock:
+            self._write_pos = _ring_write(self._data, cap, self._write_pos, chunk)
+            self._size = min(cap, self._size + n)
+
+    def window(self, num_samples: int = None) -> np.ndarray:
+        """
+        Contiguous view of the newest samples (all buffered samples by default), with no
+        reallocation. The view aliases the ring: use snapshot() to keep the samples
+        while another append may run.
+        """
+        with self._lock:
+            return self._window(num_samples)
+
+    def snapshot(self, num_samples: int = None) -> np.ndarray:
+        """Copy of window(), taken under the lock so a concurrent append cannot tear it."""
+        with self._lock:
+            return self._window(num_samples).copy()
+
+    def _window(self, num_samples: int = None) -> np.ndarray:
+        size = self._size if num_samples is None else max(0, min(self._size, int(num_samples)))
+        end = self._write_pos + self.capacity
+        return self._data[end - size:end]
+
+
+class SessionStore:
+    """
+    session_id -> RollingAudioBuffer with a lifecycle: sessions idle longer than
+    idle_ttl_s expire, and when the buffers together exceed max_bytes the least
+    recently used sessions are evicted. Sessions are kept in an OrderedDict in
+    last-use order, so both sweeps only ever look at the oldest entries.
+    """
+
+    def __init__(self, capacity: int, idle_ttl_s: float, max_bytes: int):
+        self.capacity = capacity
+        self.idle_ttl_s = idle_ttl_s
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()  # session_id -> (buffer, last_used)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"created": 0, "closed": 0, "expired": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _drop(self, session_id: str, reason: str):
+        buf, _ = self._sessions.pop(session_id)
+        self._bytes -= buf.nbytes
+        self.counters[reason] += 1
+
+    def _sweep_locked(self, now: float):
+        if self.idle_ttl_s > 0:
+            while self._sessions:
+                session_id, (_, last_used) = next(iter(self._sessions.items()))
+                if now - last_used <= self.idle_ttl_s:
+                    break
+                self._drop(session_id, "expired")
+        # Always keep the newest session, even if it alone is over budget
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)), "evicted")
+
+    def append(self, session_id: str, chunk: np.ndarray) -> RollingAudioBuffer:
+        """Append a chunk to the session's buffer, creating the session if needed."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                buf = RollingAudioBuffer(self.capacity)
+                self._bytes += buf.nbytes
+                self.counters["created"] += 1
+            else:
+                buf = entry[0]
+            self._sessions[session_id] = (buf, now)
+            self._sweep_locked(now)
+        buf.append(chunk)
+        return buf
+
+    def get(self, session_id: str) -> RollingAudioBuffer:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (entry[0], time.monotonic())
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id, "closed")
+            return True
+
+    def sweep(self):
+        with self._lock:
+            self._sweep_locked(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        self.sweep()
+        with self._lock:
+            stats = {"store": "local", "sessions": len(self._sessions), "bytes": self._bytes,
+                     "max_bytes": self.max_bytes, "idle_ttl_s": self.idle_ttl_s}
+            stats.update(self.counters)
+        return stats
+
+
+class SharedRollingBuffer:
+    """
+    The same double-written ring as RollingAudioBuffer, but living in a memory-mapped
+    file so every worker process on the host appends to and reads the same session.
+    File layout: a 64-byte header (magic, capacity, write_pos, size as int64) followed
+    by 2 * capacity float32 samples. Writers take an exclusive flock, readers a shared
+    one; a thread lock covers threads of one process, which share the flock.
+    """
+
+    HEADER_BYTES = 64
+    MAGIC = 0x46564152
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = max(1, int(capacity))
+        self.nbytes = self.HEADER_BYTES + 2 * self.capacity * 4
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size != self.nbytes:
+                    os.ftruncate(self._fd, self.nbytes)
+                if hasattr(os, "posix_fallocate"):
+                    # Reserve the pages now: a full tmpfs then fails here with ENOSPC instead
+                    # of SIGBUS-ing the worker on the first write through the mapping
+                    os.posix_fallocate(self._fd, 0, self.nbytes)
+                self._mm = mmap.mmap(self._fd, self.nbytes)
+                self._header = np.frombuffer(self._mm, dtype=np.int64, count=4)
+                self._data = np.frombuffer(self._mm, dtype=np.float32, count=2 * self.capacity, offset=self.HEADER_BYTES)
+                if self._header[0] != self.MAGIC or self._header[1] != self.capacity:
+                    self._header[:] = (self.MAGIC, self.capacity, 0, 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self.inode = os.fstat(self._fd).st_ino
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return int(self._header[3])
+
+    def append(self, chunk: np.ndarray):
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        cap = self.capacity
+        if len(chunk) > cap:
+            chunk = chunk[-cap:]
+        n = len(chunk)
+        if n == 0:
+            return
+        with self._locked(exclusive=True):
+            self._header[2] = _ring_write(self._data, cap, int(self._header[2]), chunk)
+            self._header[3] = min(cap, int(self._header[3]) + n)
+        self.touch()
+
+    def window(self, num_samples: int = None) -> np.ndarray:
+        """
+        Copy of the newest samples (all buffered samples by default). There is no view
+        variant as in RollingAudioBuffer.window(): another worker process may overwrite
+        the mapped ring as soon as the file lock is released.
+        """
+        with self._locked(exclusive=False):
+            size = int(self._header[3])
+            if num_samples is not None:
+                size = max(0, min(size, int(num_samples)))
+            end = int(self._header[2]) + self.capacity
+            return self._data[end - size:end].copy()
+
+    def snapshot(self, num_samples: int = None) -> np.ndarray:
+        # window() already copies
+        return self.window(num_samples)
+
+    def touch(self):
+        # The file mtime doubles as last-used time, so sweeps only need a stat per session
+        os.utime(self._fd)
+
+    def release(self):
+        self._header = self._data = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # a caller still holds a view; the mapping is freed with it
+        os.close(self._fd)
+
+
+class SharedSessionStore:
+    """
+    SessionStore backed by one mmap'd file per session under `directory` (tmpfs by
+    default), so consecutive chunks of a session can land on any gunicorn worker.
+    Idle expiry and the byte budget apply to all workers together, using file mtimes
+    as last-use times; the removal counters are per process.
+    """
+
+    SUFFIX = ".ring"
+
+    def __init__(self, capacity: int, idle_ttl_s: float, max_bytes: int, directory: str):
+        self.capacity = capacity
+        self.idle_ttl_s = idle_ttl_s
+        self.max_bytes = max_bytes
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._handles = {}  # session_id -> SharedRollingBuffer mapped by this process
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.counters = {"created": 0, "closed": 0, "expired": 0, "evicted": 0}
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(session_id.encode("utf-8")).hexdigest() + self.SUFFIX)
+
+    def _buffer(self, session_id: str, create: bool) -> SharedRollingBuffer:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Mappings inherited through fork share flock state with the parent; start over
+                self._handles = {}
+                self._pid = os.getpid()
+            path = self._path(session_id)
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                inode = None
+            buf = self._handles.get(session_id)
+            if buf is not None and buf.inode != inode:
+                # Closed or evicted by another worker since we mapped it
+                self._handles.pop(session_id).release()
+                buf = None
+            if buf is None:
+                if inode is None and not create:
+                    return None
+                buf = SharedRollingBuffer(path, self.capacity)
+                self._handles[session_id] = buf
+                if inode is None:
+                    self.counters["created"] += 1
+                    self._last_sweep = 0.0  # re-check the byte budget
+            return buf
+
+    def __len__(self) -> int:
+        return len(self._scan())
+
+    def __contains__(self, session_id: str) -> bool:
+        return os.path.exists(self._path(session_id))
+
+    def append(self, session_id: str, chunk: np.ndarray) -> SharedRollingBuffer:
+        buf = self._buffer(session_id, create=True)
+        buf.append(chunk)
+        if time.time() - self._last_sweep >= SESSION_SWEEP_INTERVAL_S:
+            self.sweep()
+        return buf
+
+    def get(self, session_id: str) -> SharedRollingBuffer:
+        buf = self._buffer(session_id, create=False)
+        if buf is not None:
+            buf.touch()
+        return buf
+
+    def close(self, session_id: str) -> bool:
+        buf = self._buffer(session_id, create=False)
+        if buf is None:
+            return False
+        with buf._locked(exclusive=True):
+            try:
+                os.unlink(buf.path)
+            except FileNotFoundError:
+                return False
+        with self._lock:
+            if self._handles.get(session_id) is buf:
+                self._handles.pop(session_id).release()
+            self.counters["closed"] += 1
+        return True
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.SUFFIX):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _unlink(self, path: str, reason: str) -> bool:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False  # another worker got there first
+        self.counters[reason] += 1
+        return True
+
+    def sweep(self) -> List[Tuple[float, int, str]]:
+        """Expire idle sessions, evict the oldest over the byte budget; returns the surviving entries."""
+        now = time.time()
+        self._last_sweep = now
+        entries = sorted(self._scan())
+        if self.idle_ttl_s > 0:
+            live = []
+            for mtime, size, path in entries:
+                if now - mtime > self.idle_ttl_s:
+                    self._unlink(path, "expired")
+                else:
+                    live.append((mtime, size, path))
+            entries = live
+        total = sum(size for _, size, _ in entries)
+        while total > self.max_bytes and len(entries) > 1:
+            _, size, path = entries.pop(0)
+            self._unlink(path, "evicted")
+            total -= size
+        with self._lock:
+            remaining = {path for _, _, path in entries}
+            for session_id in [sid for sid, buf in self._handles.items() if buf.path not in remaining]:
+                self._handles.pop(session_id).release()
+        return entries
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.sweep()
+        stats = {"store": "shared", "sessions": len(entries), "bytes": sum(size for _, size, _ in entries),
+                 "max_bytes": self.max_bytes, "idle_ttl_s": self.idle_ttl_s, "directory": self.directory}
+        stats.update(self.counters)
+        return stats
+
+
+def _shared_session_budget(directory: str, session_bytes: int) -> int:
+    """SESSION_MAX_BYTES clamped to what the filesystem behind `directory` can hold (0 = not even one session)."""
+    os.makedirs(directory, exist_ok=True)
+    st = os.statvfs(directory)
+    usable = int(st.f_bavail * st.f_frsize * SESSION_SHARED_FREE_FRACTION)
+    if usable < session_bytes:
+        return 0
+    if usable < SESSION_MAX_BYTES:
+        print(f"[Sessions] Only {usable / 2**20:.1f} MB usable in {directory}; "
+              f"clamping the session budget from {SESSION_MAX_BYTES / 2**20:.1f} MB")
+        return usable
+    return SESSION_MAX_BYTES
+
+def _make_session_store():
+    capacity = int(MAX_BUFFER_SECONDS * BUFFER_SR)
+    if SESSION_STORE == "shared":
+        if fcntl is None:
+            print("[Sessions] Shared session store needs POSIX file locking; using the in-process store")
+        else:
+            try:
+                max_bytes = _shared_session_budget(SESSION_SHARED_DIR,
+                                                   SharedRollingBuffer.HEADER_BYTES + 2 * capacity * 4)
+            except OSError as e:
+                print(f"[Sessions] Cannot use {SESSION_SHARED_DIR} ({e}); using the in-process store")
+                max_bytes = None
+            if max_bytes:
+                print(f"[Sessions] Using shared session store in {SESSION_SHARED_DIR}")
+                return SharedSessionStore(capacity, SESSION_IDLE_TTL_S, max_bytes, SESSION_SHARED_DIR)
+            if max_bytes == 0:
+                print(f"[Sessions] Not enough free space in {SESSION_SHARED_DIR}; using the in-process store")
+    return SessionStore(capacity, SESSION_IDLE_TTL_S, SESSION_MAX_BYTES)
+
+
+ROLLING_BUFFERS = _make_session_store()
+
+# -----------------------
+# Result cache (content-addressed)
+# -----------------------
+class ResultCache:
+    """
+    Caches successful responses under a hash of the upload bytes, MODEL_VERSION,
+    the audio backend and the request parameters that affect the result.
+    The memory tier is an LRU bounded by entry count and serialized size; the optional
+    disk tier keeps one JSON file per key and expires entries after ttl_s.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, cache_dir: str = None, ttl_s: float = 3600.0):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.cache_dir = cache_dir or None
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> serialized JSON bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._puts_since_sweep = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "disk_expired": 0}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.cache_dir is not None
+
+    @staticmethod
+    def make_key(endpoint: str, digest: str, **params) -> str:
+        parts = [endpoint, MODEL_VERSION, AUDIO_BACKEND, digest]
+        parts.extend(f"{k}={params[k]}" for k in sorted(params))
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """Return (fresh copy of the cached response, tier) or (None, None)."""
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return json.loads(blob), "memory"
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                if time.time() - os.path.getmtime(path) > self.ttl_s:
+                    os.remove(path)
+                    with self._lock:
+                        self.counters["disk_expired"] += 1
+                else:
+                    with open(path, "rb") as fh:
+                        blob = fh.read()
+                    self._put_memory(key, blob)
+                    with self._lock:
+                        self.counters["disk_hits"] += 1
+                    return json.loads(blob), "disk"
+            except (OSError, ValueError):
+                pass
+        with self._lock:
+            self.counters["misses"] += 1
+        return None, None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        blob = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        self._put_memory(key, blob)
+        with self._lock:
+            self.counters["stores"] += 1
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as fh:
+                    fh.write(blob)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"[Cache] Could not write {path}: {e}")
+            self._puts_since_sweep += 1
+            if self._puts_since_sweep >= 100:
+                self._puts_since_sweep = 0
+                self.sweep_disk()
+
+    def _put_memory(self, key: str, blob: bytes):
+        if self.max_entries == 0 or len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.counters["evictions"] += 1
+
+    def sweep_disk(self) -> int:
+        """Delete on-disk entries older than ttl_s; returns how many were removed."""
+        if not self.cache_dir:
+            return 0
+        removed = 0
+        cutoff = time.time() - self.ttl_s
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                path = os.path.join(root, fname)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self.counters["disk_expired"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes, "disk_tier": self.cache_dir is not None})
+        return stats
+
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DIR, RESULT_CACHE_TTL_S)
+
+def _cache_wanted() -> bool:
+    # Clients can force a fresh analysis with cache=0
+    return RESULT_CACHE.enabled and request.values.get("cache", "1") not in ("0", "false", "no")
+
+def _cache_status() -> str:
+    if not RESULT_CACHE.enabled:
+        return "disabled"
+    return "miss" if _cache_wanted() else "bypass"
+
+def _serve_cached(resp: Dict[str, Any], tier: str, start_ts: float) -> Dict[str, Any]:
+    """Refresh the per-request fields of a cached response and tag it as a hit."""
+    elapsed_ms = int((time.time() - start_ts) * 1000)
+    metadata = resp.setdefault("metadata", {})
+    if "processing_time_ms" in metadata:
+        metadata["processing_time_ms"] = elapsed_ms
+    if "processing_time_ms" in resp:
+        resp["processing_time_ms"] = elapsed_ms
+    if "timestamp" in resp:
+        resp["timestamp"] = datetime.utcnow().isoformat() + "Z"
+    if "recording_id" in resp:
+        # e.g. rec_<ms> / video_<ms>: each request still gets its own recording id
+        resp["recording_id"] = f"{resp['recording_id'].split('_', 1)[0]}_{int(time.time()*1000)}"
+    metadata["cache"] = "hit"
+    metadata["cache_tier"] = tier
+    return resp
+
+# -----------------------
+# Response encoding
+# -----------------------
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify() through orjson when it is installed: same documents (sorted keys), encoded several times faster."""
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=self.default, option=self.option).decode("utf-8")
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.option), mimetype=self.mimetype)
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+COLUMNAR_JSON = "application/vnd.fvatool.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.fvatool.columnar+msgpack"
+RESPONSE_MIMETYPES = ("application/json", "application/msgpack", "application/x-msgpack", COLUMNAR_JSON, COLUMNAR_MSGPACK)
+COMPACT_DROPPED_FIELDS = ("raw_emotion_scores", "audio_features", "bbox_pixel")  # left out with verbosity=compact
+ALWAYS_INCLUDED_FIELDS = ("success", "error", "message")  # kept whatever fields= selects
+
+def _drop_fields(obj: Any, names: Tuple[str, ...]) -> Any:
+    """Copy of obj without any dict entries named in names, at any depth."""
+    if isinstance(obj, dict):
+        return {k: _drop_fields(v, names) for k, v in obj.items() if k not in names}
+    if isinstance(obj, list):
+        return [_drop_fields(v, names) for v in obj]
+    return obj
+
+def _select_fields(obj: Any, paths: List[List[str]]) -> Any:
+    """Copy of obj keeping only the dotted paths; a path continues into every element of a list."""
+    if any(not path for path in paths):
+        return obj
+    if isinstance(obj, list):
+        return [_select_fields(v, paths) for v in obj]
+    if not isinstance(obj, dict):
+        return obj
+    selected = {}
+    for key, value in obj.items():
+        rest = [path[1:] for path in paths if path[0] == key]
+        if rest:
+            selected[key] = _select_fields(value, rest)
+    return selected
+
+def shape_response(payload: Dict[str, Any], fields: str = None, verbosity: str = None) -> Dict[str, Any]:
+    """
+    Apply the fields= / verbosity= request params to a response body.
+    verbosity=compact leaves out COMPACT_DROPPED_FIELDS; fields=analysis.primary_emotion,metadata.cache
+    keeps only those dotted paths (plus ALWAYS_INCLUDED_FIELDS). The payload itself is not modified.
+    """
+    if (verbosity or "full").lower() == "compact":
+        payload = _drop_fields(payload, COMPACT_DROPPED_FIELDS)
+    if fields:
+        paths = [f.strip().split(".") for f in fields.split(",") if f.strip()]
+        paths += [[name] for name in ALWAYS_INCLUDED_FIELDS]
+        payload = _select_fields(payload, paths)
+    return payload
+
+def to_columnar(obj: Any) -> Any:
+    """
+    Lists of records sharing the same keys (detections, frame_detections, timeline, ...)
+    become one dict of column lists, which is smaller and cheaper to encode and decode.
+    """
+    if isinstance(obj, dict):
+        return {k: to_columnar(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        items = [to_columnar(v) for v in obj]
+        if items and all(isinstance(v, dict) for v in items):
+            keys = list(items[0])
+            if all(list(v) == keys for v in items[1:]):
+                return {k: [v[k] for v in items] for k in keys}
+        return items
+    return obj
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+def _negotiated_mimetype() -> str:
+    offered = [m for m in RESPONSE_MIMETYPES if msgpack is not None or "msgpack" not in m]
+    return request.accept_mimetypes.best_match(offered, default="application/json")
+
+def _respond(payload: Dict[str, Any], status: int = 200) -> Response:
+    """
+    Encode an inference response: fields= / verbosity= first, then JSON, MessagePack
+    (floats as float32) or the columnar variants of either, whichever the Accept header prefers.
+    Error documents ("success": false) use the same encoding but are never trimmed.
+    """
+    if payload.get("success") is not False:
+        payload = shape_response(payload, request.values.get("fields"), request.values.get("verbosity"))
+    mimetype = _negotiated_mimetype()
+    if mimetype in (COLUMNAR_JSON, COLUMNAR_MSGPACK):
+        payload = to_columnar(payload)
+    if "msgpack" in mimetype:
+        # Every float in these responses is a rounded score or comes from float32 tensors, so float32 loses nothing useful
+        body = msgpack.packb(payload, use_bin_type=True, use_single_float=True, default=_msgpack_default)
+    else:
+        body = app.json.dumps(payload)
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+# -----------------------
+# Audio inference backends
+# -----------------------
+def onnx_model_path(quantized: bool = False, model_dir: str = None) -> str:
+    return os.path.join(model_dir or ONNX_MODEL_DIR, "emotion.int8.onnx" if quantized else "emotion.onnx")
+
+class TorchAudioBackend:
+    """Eager PyTorch forward pass of the Wav2Vec2 classifier."""
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def run(self, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        tensors = {
+            "input_values": torch.from_numpy(np.ascontiguousarray(feeds["input_values"], dtype=np.float32))
+        }
+        if feeds.get("attention_mask") is not None:
+            tensors["attention_mask"] = torch.from_numpy(np.asarray(feeds["attention_mask"], dtype=np.int64))
+        with torch.no_grad():
+            return self.model(**tensors).logits.detach().cpu().numpy()
+
+class OnnxAudioBackend:
+    """ONNX Runtime CPU session over an exported (optionally int8-quantized) graph."""
+
+    def __init__(self, path: str, name: str = "onnx"):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed; pip install onnxruntime to use the ONNX backends")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run `python FVATool.py export-onnx` first")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        self.name = name
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def run(self, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        ort_feeds = {"input_values": np.ascontiguousarray(feeds["input_values"], dtype=np.float32)}
+        if "attention_mask" in self.input_names:
+            mask = feeds.get("attention_mask")
+            if mask is None:
+                mask = np.ones(ort_feeds["input_values"].shape, dtype=np.int64)
+            ort_feeds["attention_mask"] = np.asarray(mask, dtype=np.int64)
+        return self.session.run(["logits"], ort_feeds)[0]
+
+# -----------------------
+# Inference scheduler (dynamic micro-batching)
+# -----------------------
+class _PendingInference:
+    """A single clip waiting for the batcher, plus the slot its logits come back in."""
+    __slots__ = ("speech", "sampling_rate", "enqueued_at", "done", "logits", "error", "queue_wait_ms", "batch_size")
+
+    def __init__(self, speech: np.ndarray, sampling_rate: int):
+        self.speech = speech
+        self.sampling_rate = sampling_rate
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.logits = None
+        self.error = None
+        self.queue_wait_ms = 0.0
+        self.batch_size = 0
+
+
+def _audio_padding_masked() -> bool:
+    """Whether the audio model honours an attention mask over padded samples."""
+    return bool(getattr(audio_processor, "return_attention_mask", False))
+
+
+class InferenceBatcher:
+    """
+    Collects audio inference requests from concurrent Flask threads and runs them
+    through audio_processor and the selected audio backend as one padded batch.
+
+    Padded clips get an attention mask so their logits do not depend on their batch
+    mates; clips whose lengths differ by more than max_pad_ratio are split so padding
+    does not dominate compute. Only then do separate requests gain from sharing a pass:
+    when the feature extractor produces no mask (group-norm Wav2Vec2 checkpoints, where
+    a mask could not hide the padding anyway) only clips of equal length are batched,
+    which in practice means the windows of one long recording queued via submit_many.
+
+    So the first request in a window waits at most max_wait_ms for others to arrive
+    only if masked batching is possible and this process is serving another short
+    request (/stream sockets do not count); otherwise it runs with whatever is already
+    queued. A window closes early once max_batch_size clips are pending.
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 5.0, max_pad_ratio: float = 1.5):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_pad_ratio = max(1.0, float(max_pad_ratio))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, speech: np.ndarray, sampling_rate: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Block until the clip has been run; returns (logits, scheduling stats)."""
+        self._ensure_worker()
+        item = _PendingInference(speech, sampling_rate)
+        self._queue.put(item)
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.logits, {"queue_wait_ms": round(item.queue_wait_ms, 2), "batch_size": item.batch_size}
+
+    def submit_many(self, speeches: List[np.ndarray], sampling_rate: int) -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+        """Queue several clips at once so they can share forward passes; results come back in order."""
+        self._ensure_worker()
+        items = [_PendingInference(speech, sampling_rate) for speech in speeches]
+        for item in items:
+            self._queue.put(item)
+        results = []
+        for item in items:
+            item.done.wait()
+            if item.error is not None:
+                raise item.error
+            results.append((item.logits, {"queue_wait_ms": round(item.queue_wait_ms, 2), "batch_size": item.batch_size}))
+        return results
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork (gunicorn workers), so the worker is started per process
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="audio-batcher", daemon=True)
+            self._thread.start()
+
+    def _collect(self) -> List[_PendingInference]:
+        batch = [self._queue.get()]
+        # A lone request has nobody to wait for, and without a mask its company could not join anyway
+        waiting_pays = ACTIVE_REQUESTS["count"] > 1 and _audio_padding_masked()
+        max_wait_s = self.max_wait_s if waiting_pays else 0.0
+        deadline = time.perf_counter() + max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _split(self, batch: List[_PendingInference]) -> List[List[_PendingInference]]:
+        groups = []
+        masked = _audio_padding_masked()
+        for sampling_rate in sorted({item.sampling_rate for item in batch}):
+            items = sorted((item for item in batch if item.sampling_rate == sampling_rate), key=lambda it: len(it.speech))
+            current = []
+            for item in items:
+                if current and self._needs_split(len(current[0].speech), len(item.speech), masked):
+                    groups.append(current)
+                    current = []
+                current.append(item)
+            if current:
+                groups.append(current)
+        return groups
+
+    def _needs_split(self, shortest: int, length: int, masked: bool) -> bool:
+        if not masked:
+            return length != shortest
+        return length > self.max_pad_ratio * max(1, shortest)
+
+    def _run(self):
+        _configure_torch_threads()
+        while True:
+            batch = self._collect()
+            for group in self._split(batch):
+                self._run_batch(group)
+
+    def _run_batch(self, items: List[_PendingInference]):
+        started = time.perf_counter()
+        for item in items:
+            item.queue_wait_ms = (started - item.enqueued_at) * 1000.0
+            item.batch_size = len(items)
+        try:
+            with stage_timer("preprocess"):
+                inputs = audio_processor(
+                    [item.speech for item in items],
+                    sampling_rate=items[0].sampling_rate,
+                    return_tensors="np",
+                    padding=True,
+                    return_attention_mask=_audio_padding_masked()
+                )
+            print(f"[Audio] Batch of {len(items)}, input tensor shape: {tuple(inputs['input_values'].shape)}")
+            with stage_timer("model_forward"):
+                logits = audio_engine.run(dict(inputs))
+            for i, item in enumerate(items):
+                item.logits = logits[i]
+        except Exception as e:
+            for item in items:
+                item.error = e
+        finally:
+            for item in items:
+                item.done.set()
+
+
+AUDIO_BATCHER = InferenceBatcher(INFER_MAX_BATCH_SIZE, INFER_MAX_WAIT_MS, INFER_MAX_PAD_RATIO)
+
+# -----------------------
+# Voice activity detection
+# -----------------------
+def _vad_wanted(value: str = None) -> bool:
+    """`vad` request param ("1"/"0"), falling back to VAD_ENABLED."""
+    if value is None or value == "":
+        return VAD_ENABLED
+    return value.lower() in ("1", "true", "yes")
+
+def _speech_frame_mask(y: np.ndarray, frame: int) -> np.ndarray:
+    """
+    Per-frame speech decision from frame energy (relative to the clip's noise floor)
+    and spectral flatness (noise is flat, voiced speech is not).
+    """
+    n_frames = -(-len(y) // frame)
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    flatness = np.empty(n_frames, dtype=np.float32)
+    for f0 in range(0, n_frames, VAD_BLOCK_FRAMES):
+        f1 = min(n_frames, f0 + VAD_BLOCK_FRAMES)
+        block = y[f0 * frame:f1 * frame]
+        if len(block) < (f1 - f0) * frame:
+            block = np.pad(block, (0, (f1 - f0) * frame - len(block)))
+        frames = block.reshape(f1 - f0, frame)
+        energy_db[f0:f1] = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        power = np.abs(np.fft.rfft(frames, axis=1)) ** 2 + 1e-10
+        flatness[f0:f1] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    noise_floor = float(np.percentile(energy_db, 10))
+    peak = float(energy_db.max())
+    if peak - noise_floor < VAD_SNR_DB:
+        # Stationary clip (all speech or all noise): there is no floor to compare against, so
+        # only the absolute floor and flatness decide; otherwise steady speech would be cut entirely
+        threshold = VAD_ENERGY_FLOOR_DB
+    else:
+        threshold = max(VAD_ENERGY_FLOOR_DB, min(noise_floor + VAD_SNR_DB, (noise_floor + peak) / 2))
+    return (energy_db > threshold) & (flatness < VAD_MAX_FLATNESS)
+
+def detect_speech_regions(y: np.ndarray, sr: int) -> List[Tuple[int, int]]:
+    """[start, end) sample ranges of speech, padded by VAD_PAD_MS and merged where the padding overlaps."""
+    y = np.asarray(y, dtype=np.float32).reshape(-1)
+    frame = max(1, int(sr * VAD_FRAME_MS / 1000))
+    if len(y) == 0:
+        return []
+    mask = _speech_frame_mask(y, frame)
+
+    # Drop bursts shorter than VAD_MIN_SPEECH_MS (clicks, bumps)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) * VAD_FRAME_MS >= VAD_MIN_SPEECH_MS
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) == 0:
+        return []
+
+    pad = int(VAD_PAD_MS / VAD_FRAME_MS)
+    starts = np.maximum(starts - pad, 0)
+    ends = np.minimum(ends + pad, len(mask))
+    regions = []
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        if regions and a <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], b)
+        else:
+            regions.append([a, b])
+    return [(a * frame, min(b * frame, len(y))) for a, b in regions]
+
+def trim_to_speech(speech: np.ndarray, sr: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Keep only the speech regions of a prepared clip. Returns the trimmed signal (empty
+    when there is no speech) and the stats reported in metadata.audio_features.
+    """
+    with stage_timer("vad"):
+        regions = detect_speech_regions(speech, sr)
+        kept = sum(b - a for a, b in regions)
+        if len(regions) == 1 and kept == len(speech):
+            trimmed = speech
+        else:
+            trimmed = np.concatenate([speech[a:b] for a, b in regions]) if regions else speech[:0]
+    stats = {
+        "speech_ratio": round(kept / len(speech), 3) if len(speech) else 0.0,
+        "samples_saved": int(len(speech) - kept),
+        "speech_regions": len(regions)
+    }
+    print(f"[VAD] {len(regions)} speech regions, kept {kept}/{len(speech)} samples")
+    return trimmed, stats
+
+def _no_speech_response(y: np.ndarray, sr: int, vad_stats: Dict[str, Any], start_ts: float) -> Dict[str, Any]:
+    """Cheap response for clips without speech: neutral result, no model call and no pitch/tempo analysis."""
+    prediction = {label: (1.0 if label == "Neutral" else 0.0) for label in id2label_raw.values()}
+    audio_feats = _empty_audio_features()
+    audio_feats["rms"] = float(np.sqrt(np.mean(np.square(y, dtype=np.float64)))) if len(y) else 0.0
+    with stage_timer("postprocess"):
+        response = _build_audio_response(prediction, audio_feats, {"queue_wait_ms": 0.0, "batch_size": 0}, start_ts)
+    response["analysis"]["speech_detected"] = False
+    response["metadata"]["confidence_score"] = 0.0
+    response["metadata"]["audio_features"].update(vad_stats)
+    return response
+
+# -----------------------
+# Core processing - EXACTLY matching original Gradio code
+# -----------------------
+# classify_audio function kept for reference - actual processing now in _process_array_and_build_response
+
+def _prepare_speech(y: np.ndarray, sr: int) -> np.ndarray:
+    """Validate and normalize a decoded clip for the emotion model - EXACTLY as original."""
     # Validate input
     if y is None or len(y) == 0:
         raise ValueError("Audio array is empty")
@@ -264,9 +2295,7 @@ def _process_array_and_build_response(y: np.ndarray, sr: int, start_ts: float =
     if np.all(speech == 0):
         print("[Audio] Warning: Audio appears to be silence (all zeros)")
     
-    sample_rate = sr
-    
-    print(f"[Audio] Processing: {len(speech)} samples, {len(speech)/sample_rate:.2f}s, SR: {sample_rate}Hz")
+    print(f"[Audio] Processing: {len(speech)} samples, {len(speech)/sr:.2f}s, SR: {sr}Hz")
     
     # Normalize audio to prevent clipping and ensure consistent processing
     # Clip extreme values to prevent issues
@@ -277,26 +2306,12 @@ def _process_array_and_build_response(y: np.ndarray, sr: int, start_ts: float =
             speech = speech / max_val
         # Ensure values are in valid range
         speech = np.clip(speech, -1.0, 1.0)
-    
-    # Process audio - EXACTLY as in original classify_audio function
-    inputs = audio_processor(
-        speech,
-        sampling_rate=sample_rate,
-        return_tensors="pt",
-        padding=True
-    )
-    
-    # Debug: Check input tensor shape
-    if hasattr(inputs, 'input_values'):
-        print(f"[Audio] Input tensor shape: {inputs.input_values.shape}")
-    
-    # Model inference - EXACTLY as in original
-    with torch.no_grad():
-        outputs = audio_model(**inputs)
-        logits = outputs.logits
-        probs = torch.nn.functional.softmax(logits, dim=1).squeeze().tolist()
-        if isinstance(probs, float):
-            probs = [probs]
+    return speech
+
+def _softmax_probs(logits: np.ndarray) -> List[float]:
+    logits = np.asarray(logits, dtype=np.float64).reshape(-1)
+    exp_logits = np.exp(logits - logits.max())
+    probs = (exp_logits / exp_logits.sum()).tolist()
     
     # Ensure we have the correct number of probabilities (8 emotions)
     expected_labels = len(id2label_raw)
@@ -307,43 +2322,34 @@ def _process_array_and_build_response(y: np.ndarray, sr: int, start_ts: float =
             probs = probs + [0.0] * (expected_labels - len(probs))
         else:
             probs = probs[:expected_labels]
-    
+    return probs
+
+def _prediction_from_probs(probs: List[float]) -> Dict[str, float]:
     # Prediction - EXACTLY as in original
-    prediction = {
+    return {
         id2label_raw[str(i)]: round(probs[i], 3) for i in range(len(probs))
     }
-    
+
+def _emotions_from_prediction(prediction: Dict[str, float]) -> Tuple[Dict[str, float], str]:
+    """Wellness emotion percentages and the primary (highest probability) model label."""
+    # Convert prediction dict to raw_probs format for compatibility
+    label_to_idx = {lbl: idx for idx, lbl in id2label_raw.items()}
+    raw_probs = {label_to_idx[label]: prob for label, prob in prediction.items() if label in label_to_idx}
+    primary_emotion = max(prediction.items(), key=lambda kv: kv[1])[0]
+    return normalize_emotion_probs(raw_probs), primary_emotion
+
+def _build_audio_response(prediction: Dict[str, float], audio_feats: Dict[str, Any],
+                          batch_stats: Dict[str, Any], start_ts: float) -> Dict[str, Any]:
+    """Turn a model prediction and acoustic features into the /infer response body."""
     # Debug: Print top predictions
     sorted_predictions = sorted(prediction.items(), key=lambda kv: kv[1], reverse=True)
     print(f"[Audio] Top predictions: {sorted_predictions[:3]}")
     
-    # Convert prediction dict to raw_probs format for compatibility
-    raw_probs = {}
-    for label, prob in prediction.items():
-        # Find the index for this label
-        for idx, lbl in id2label_raw.items():
-            if lbl == label:
-                raw_probs[idx] = prob
-                break
-    
-    # Keep raw copy for audio features
-    raw_y = np.asarray(y).astype(np.float32).flatten()
-    try:
-        raw_rms = float(np.mean(librosa.feature.rms(y=raw_y)))
-    except Exception:
-        raw_rms = None
-    
-    # Use original audio (not normalized/trimmed) for features
-    audio_feats = compute_basic_audio_features(raw_y, sr)
-    
     # Get raw label scores (from prediction dict)
     raw_label_scores = {label: round(prob * 100, 3) for label, prob in prediction.items()}
     
-    # Get primary emotion from prediction (highest probability) FIRST
-    primary_emotion = max(prediction.items(), key=lambda kv: kv[1])[0]
-    
-    # Normalize emotions for wellness metrics
-    normalized_emotions = normalize_emotion_probs(raw_probs)
+    # Normalize emotions for wellness metrics; primary emotion comes from the highest probability
+    normalized_emotions, primary_emotion = _emotions_from_prediction(prediction)
     # Pass primary emotion to metrics calculation for better score alignment
     metrics = derive_health_metrics(normalized_emotions, audio_feats, primary_emotion)
     recommendations = generate_recommendations(metrics, normalized_emotions)
@@ -370,21 +2376,763 @@ def _process_array_and_build_response(y: np.ndarray, sr: int, start_ts: float =
             "processing_time_ms": processing_time_ms,
             "model_version": MODEL_VERSION,
             "confidence_score": confidence_score,
+            "inference_backend": audio_engine.name,
+            "queue_wait_ms": batch_stats["queue_wait_ms"],
+            "inference_batch_size": batch_stats["batch_size"],
             "audio_features": {},
             "raw_emotion_scores": raw_label_scores
         }
     }
-    
-    # Combine audio features with raw_rms
-    audio_features_combined = {"raw_rms": raw_rms}
-    audio_features_combined.update(audio_feats)
-    response["metadata"]["audio_features"] = audio_features_combined
-    return response
+    
+    # Combine audio features with raw_rms (the same framed RMS)
+    audio_features_combined = {"raw_rms": audio_feats["rms"]}
+    audio_features_combined.update(audio_feats)
+    response["metadata"]["audio_features"] = audio_features_combined
+    return response
+
+def _feature_deadline(start_ts: float, latency_budget_ms: float = None) -> float:
+    return start_ts + latency_budget_ms / 1000.0 if latency_budget_ms else None
+
+def _process_array_and_build_response(y: np.ndarray, sr: int, start_ts: float = None, vad: bool = None,
+                                      profile: str = None, latency_budget_ms: float = None) -> Dict[str, Any]:
+    """
+    Process audio array and build response - now uses EXACT original logic.
+    With VAD on (default VAD_ENABLED) only speech regions reach the model. profile and
+    latency_budget_ms decide which acoustic features are estimated (see FEATURE_PROFILES).
+    """
+    if start_ts is None:
+        start_ts = time.time()
+    speech = _prepare_speech(y, sr)
+    vad_stats = None
+    if vad if vad is not None else VAD_ENABLED:
+        speech, vad_stats = trim_to_speech(speech, sr)
+        if len(speech) == 0:
+            return _no_speech_response(y, sr, vad_stats, start_ts)
+    
+    # Only the model forward pass goes through the shared micro-batcher; acoustic features are computed below
+    logits, batch_stats = AUDIO_BATCHER.submit(speech, sr)
+    
+    # Use original audio (not normalized/trimmed) for features
+    feature_report = {}
+    with stage_timer("feature_extraction"):
+        audio_feats = compute_basic_audio_features(np.asarray(y).astype(np.float32).flatten(), sr, profile,
+                                                   _feature_deadline(start_ts, latency_budget_ms), feature_report)
+    
+    with stage_timer("postprocess"):
+        prediction = _prediction_from_probs(_softmax_probs(logits))
+        response = _build_audio_response(prediction, audio_feats, batch_stats, start_ts)
+    response["metadata"]["feature_profile"] = feature_report
+    if vad_stats is not None:
+        response["analysis"]["speech_detected"] = True
+        response["metadata"]["audio_features"].update(vad_stats)
+    return response
+
+def _window_bounds(num_samples: int, window: int, hop: int) -> List[Tuple[int, int]]:
+    """Overlapping [start, end) windows covering the signal; the last one is aligned to the end."""
+    if num_samples <= window:
+        return [(0, num_samples)]
+    starts = list(range(0, num_samples - window + 1, hop))
+    if starts[-1] + window < num_samples:
+        starts.append(num_samples - window)
+    return [(start, start + window) for start in starts]
+
+def _aggregate_audio_features(feats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-window features: median for pitch, mean for everything else, skipping missing values."""
+    combined = {}
+    for key in feats[0]:
+        values = [f[key] for f in feats if f.get(key) is not None]
+        if not values:
+            combined[key] = None
+        elif key == "median_f0_hz":
+            combined[key] = float(np.median(values))
+        else:
+            combined[key] = float(np.mean(values))
+    return combined
+
+def _process_long_audio(y: np.ndarray, sr: int, start_ts: float = None,
+                        window_s: float = LONG_AUDIO_WINDOW_S, hop_s: float = LONG_AUDIO_HOP_S,
+                        vad: bool = None, profile: str = None, latency_budget_ms: float = None) -> Dict[str, Any]:
+    """
+    Analyse a long recording as overlapping windows. Windows go through the batcher
+    LONG_AUDIO_GROUP_SIZE at a time, so model memory depends on the window length, not
+    the recording length. Returns the usual response (built from the mean window
+    probabilities and aggregated features) plus a per-window `timeline`.
+    With VAD on, windows without speech are skipped and left out of the timeline.
+    """
+    if start_ts is None:
+        start_ts = time.time()
+    speech = _prepare_speech(y, sr)
+    raw_y = np.asarray(y, dtype=np.float32).reshape(-1)
+    window = max(1, int(window_s * sr))
+    hop = max(1, int(min(hop_s, window_s) * sr))
+    all_bounds = bounds = _window_bounds(len(speech), window, hop)
+    vad_stats = None
+    if vad if vad is not None else VAD_ENABLED:
+        with stage_timer("vad"):
+            regions = detect_speech_regions(speech, sr)
+        bounds = [(a, b) for a, b in all_bounds if any(ra < b and a < rb for ra, rb in regions)]
+        kept = sum(b - a for a, b in regions)
+        vad_stats = {
+            "speech_ratio": round(kept / len(speech), 3),
+            "samples_saved": int(sum(b - a for a, b in all_bounds) - sum(b - a for a, b in bounds)),
+            "speech_regions": len(regions)
+        }
+        if not bounds:
+            return _no_speech_response(raw_y, sr, vad_stats, start_ts)
+    print(f"[Audio] Long-audio mode: {len(bounds)}/{len(all_bounds)} windows of {window_s}s, hop {hop_s}s")
+    deadline = _feature_deadline(start_ts, latency_budget_ms)
+    feature_report = {}
+
+    timeline, window_probs, window_feats = [], [], []
+    queue_wait_ms, max_batch = 0.0, 0
+    for g0 in range(0, len(bounds), LONG_AUDIO_GROUP_SIZE):
+        group = bounds[g0:g0 + LONG_AUDIO_GROUP_SIZE]
+        outputs = AUDIO_BATCHER.submit_many([speech[a:b] for a, b in group], sr)
+        with stage_timer("feature_extraction"):
+            feats = compute_basic_audio_features_batch([raw_y[a:b] for a, b in group], sr, profile, deadline, feature_report)
+        with stage_timer("postprocess"):
+            for (a, b), (logits, stats), f in zip(group, outputs, feats):
+                probs = _softmax_probs(logits)
+                emotions, primary = _emotions_from_prediction(_prediction_from_probs(probs))
+                metrics = derive_health_metrics(emotions, f, primary)
+                timeline.append({
+                    "start_s": round(a / sr, 2),
+                    "end_s": round(b / sr, 2),
+                    "primary_emotion": primary.lower(),
+                    "confidence": round(max(probs), 3),
+                    "emotions": emotions,
+                    "stress_level": metrics["stress_level"],
+                    "energy_level": metrics["energy_level"],
+                    "wellness_score": metrics["wellness_score"]
+                })
+                window_probs.append(probs)
+                queue_wait_ms += stats["queue_wait_ms"]
+                max_batch = max(max_batch, stats["batch_size"])
+        window_feats.extend(feats)
+
+    prediction = _prediction_from_probs(np.mean(window_probs, axis=0).tolist())
+    batch_stats = {"queue_wait_ms": round(queue_wait_ms, 2), "batch_size": max_batch}
+    response = _build_audio_response(prediction, _aggregate_audio_features(window_feats), batch_stats, start_ts)
+    response["timeline"] = timeline
+    response["metadata"]["feature_profile"] = feature_report
+    response["metadata"]["long_audio"] = {
+        "duration_sec": round(len(raw_y) / sr, 2),
+        "window_s": window_s,
+        "hop_s": hop_s,
+        "windows": len(bounds),
+        "silent_windows": len(all_bounds) - len(bounds)
+    }
+    if vad_stats is not None:
+        response["analysis"]["speech_detected"] = True
+        response["metadata"]["audio_features"].update(vad_stats)
+    return response
+
+def _analyze_audio(y: np.ndarray, sr: int, start_ts: float = None, long_audio: str = "auto", vad: bool = None,
+                   profile: str = None, latency_budget_ms: float = None) -> Dict[str, Any]:
+    """Single-pass analysis, or windowed analysis when forced ("1") or the clip is longer than LONG_AUDIO_AUTO_S."""
+    duration = len(y) / float(sr)
+    if long_audio in ("1", "true", "yes") or (
+            long_audio == "auto" and LONG_AUDIO_AUTO_S > 0 and duration > LONG_AUDIO_AUTO_S):
+        return _process_long_audio(y, sr, start_ts=start_ts, vad=vad, profile=profile, latency_budget_ms=latency_budget_ms)
+    return _process_array_and_build_response(y, sr, start_ts=start_ts, vad=vad, profile=profile,
+                                             latency_budget_ms=latency_budget_ms)
+
+# -----------------------
+# Video helpers
+# -----------------------
+def _iter_sampled_frames(cap, frame_skip: int, frame_count: int, stats: Dict[str, Any]):
+    """
+    Yield (frame_idx, frame) for every frame_skip-th frame of an open VideoCapture.
+    Frames in between are only grabbed (no retrieve / colour conversion) or, when
+    VIDEO_SEEK_MIN_SKIP allows it, jumped over with a seek. Decode time and counts
+    are accumulated in `stats`.
+    """
+    use_seek = VIDEO_SEEK_MIN_SKIP > 0 and frame_skip >= VIDEO_SEEK_MIN_SKIP and frame_count > 0
+    frame_idx = 0
+    while True:
+        t0 = time.perf_counter()
+        if frame_idx % frame_skip == 0:
+            ret, frame = cap.read()
+            stats["decode_s"] += time.perf_counter() - t0
+            if not ret:
+                break
+            stats["decoded_frames"] += 1
+            yield frame_idx, frame
+            frame_idx += 1
+            continue
+        next_idx = (frame_idx // frame_skip + 1) * frame_skip
+        if use_seek and cap.set(cv2.CAP_PROP_POS_FRAMES, next_idx):
+            stats["seeks"] += 1
+            frame_idx = next_idx
+            stats["decode_s"] += time.perf_counter() - t0
+            if frame_idx >= frame_count:
+                break
+            continue
+        ok = cap.grab()
+        stats["decode_s"] += time.perf_counter() - t0
+        if not ok:
+            break
+        stats["grabbed_frames"] += 1
+        frame_idx += 1
+
+def _result_arrays(result, conf_threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Class ids, confidences and xyxy pixel boxes of one YOLO result, thresholded at conf_threshold.
+    boxes.data comes to the host in a single transfer instead of one tensor index per box.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty((0, 4), dtype=np.float32)
+    data = boxes.data.cpu().numpy()  # rows: x1, y1, x2, y2, [track_id,] conf, cls
+    data = data[data[:, -2] >= conf_threshold]
+    return data[:, -1].astype(np.int64), data[:, -2], data[:, :4]
+
+class DetectionAggregator:
+    """
+    Per-class count, min / max / mean confidence and first / last seen time, kept as
+    arrays indexed by class id so a frame (or a whole video) folds in with a few numpy ops.
+    summary() returns the detected_objects dict, classes in order of first detection.
+    """
+
+    def __init__(self, with_seen: bool = True):
+        self.with_seen = with_seen
+        self._order = []  # class ids in order of first detection
+        self._resize(max(video_model.names) + 1 if video_model is not None and video_model.names else 0)
+
+    def _resize(self, size: int):
+        old = getattr(self, "_count", np.zeros(0, dtype=np.int64))
+        grow = size - len(old)
+
+        def pad(arr, fill):
+            return np.concatenate([arr, np.full(grow, fill, dtype=arr.dtype)]) if arr is not None else np.full(size, fill, dtype=np.float64)
+
+        self._count = np.concatenate([old, np.zeros(grow, dtype=np.int64)])
+        self._conf_sum = pad(getattr(self, "_conf_sum", None), 0.0)
+        self._conf_max = pad(getattr(self, "_conf_max", None), -np.inf)
+        self._conf_min = pad(getattr(self, "_conf_min", None), np.inf)
+        self._first_seen = pad(getattr(self, "_first_seen", None), np.inf)
+        self._last_seen = pad(getattr(self, "_last_seen", None), -np.inf)
+
+    def add(self, cls: np.ndarray, conf: np.ndarray, seen_at=0.0):
+        """Fold detections in; seen_at is a scalar time or one time per detection."""
+        if len(cls) == 0:
+            return
+        if int(cls.max()) >= len(self._count):
+            self._resize(int(cls.max()) + 1)
+        classes, first_idx = np.unique(cls, return_index=True)
+        fresh = self._count[classes] == 0
+        self._order.extend(classes[fresh][np.argsort(first_idx[fresh])].tolist())
+
+        conf = conf.astype(np.float64)
+        size = len(self._count)
+        self._count += np.bincount(cls, minlength=size)
+        self._conf_sum += np.bincount(cls, weights=conf, minlength=size)
+        np.maximum.at(self._conf_max, cls, conf)
+        np.minimum.at(self._conf_min, cls, conf)
+        seen = np.broadcast_to(np.asarray(seen_at, dtype=np.float64), cls.shape)
+        np.minimum.at(self._first_seen, cls, seen)
+        np.maximum.at(self._last_seen, cls, seen)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def summary(self) -> Dict[str, Any]:
+        names = video_model.names
+        out = {}
+        for c in self._order:
+            count = int(self._count[c])
+            entry = {"count": count, "max_confidence": float(self._conf_max[c])}
+            if self.with_seen:
+                entry.update({
+                    "min_confidence": float(self._conf_min[c]),
+                    "first_seen": float(self._first_seen[c]),
+                    "last_seen": float(self._last_seen[c])
+                })
+            entry["avg_confidence"] = float(self._conf_sum[c] / count)
+            out[names[c]] = entry
+        return out
+
+def _collect_frame_detections(result, frame_idx: int, fps: float, conf_threshold: float,
+                              aggregator: DetectionAggregator) -> List[Dict[str, Any]]:
+    """Turn one YOLO result into frame detections and fold them into aggregator."""
+    cls, conf, xyxy = _result_arrays(result, conf_threshold)
+    if len(cls) == 0:
+        return []
+    aggregator.add(cls, conf, round(frame_idx / fps, 2) if fps > 0 else 0.0)
+    names = video_model.names
+    return [
+        {"class": names[c], "confidence": round(p, 3), "bbox": bbox}
+        for c, p, bbox in zip(cls.tolist(), conf.tolist(), xyxy.tolist())
+    ]
+
+def _motion_thumbnail(frame: np.ndarray) -> np.ndarray:
+    """Tiny grayscale copy of a frame used for cheap inter-frame difference scores."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+class MotionGate:
+    """
+    Decides which sampled frames are worth a detector call. Each frame's thumbnail is
+    compared with the last frame that was sent to YOLO (not just the previous one, so
+    slow drift still adds up); near-duplicates are skipped unless the gap since the
+    last detection would exceed 1 / min_fps.
+
+    Changed frames spend from a token bucket refilled at budget_fps (holding at most
+    one second's worth), so sustained motion cannot push the detector above budget_fps
+    while a burst after a quiet stretch is still sampled at the full candidate rate.
+    """
+
+    def __init__(self, fps: float, min_fps: float, threshold: float, budget_fps: float = None):
+        self.fps = fps
+        self.max_gap = fps / min_fps if fps > 0 and min_fps > 0 else float("inf")
+        self.threshold = threshold
+        self.budget_fps = budget_fps
+        self.skipped = 0
+        self.throttled = 0  # changed frames skipped because the budget was spent
+        self._ref = None
+        self._ref_idx = 0
+        self._burst = max(1.0, budget_fps or 0.0)
+        self._tokens = self._burst
+        self._last_idx = 0
+
+    def _refill(self, frame_idx: int):
+        if self.budget_fps and self.fps > 0:
+            elapsed_s = (frame_idx - self._last_idx) / self.fps
+            self._tokens = min(self._burst, self._tokens + elapsed_s * self.budget_fps)
+        self._last_idx = frame_idx
+
+    def should_detect(self, frame_idx: int, frame: np.ndarray) -> bool:
+        self._refill(frame_idx)
+        thumb = _motion_thumbnail(frame)
+        forced = self._ref is None or frame_idx - self._ref_idx >= self.max_gap
+        changed = not forced and float(np.mean(np.abs(thumb - self._ref))) >= self.threshold
+        if changed and self.budget_fps and self._tokens < 1.0:
+            self.throttled += 1
+            return False
+        if forced or changed:
+            self._tokens -= 1.0
+            self._ref = thumb
+            self._ref_idx = frame_idx
+            return True
+        self.skipped += 1
+        return False
+
+def _box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+class IoUTracker:
+    """
+    Greedy IoU multi-object tracker with constant-velocity motion.
+    update() matches keyframe detections to tracks of the same class by IoU against
+    each track's predicted box, then by centre distance for fast movers; propagate()
+    moves tracks between keyframes without running the detector.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 2, max_center_shift: float = 1.0):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.max_center_shift = max_center_shift
+        self.tracks = {}  # track_id -> state
+        self._next_id = 1
+
+    def _active(self) -> List[int]:
+        return [tid for tid, tr in self.tracks.items() if tr["active"]]
+
+    def _predict(self, track: Dict[str, Any], t: float) -> np.ndarray:
+        # Extrapolate from the last observed box, so propagation never accumulates drift
+        dt = t - track["t"]
+        return track["bbox"] + np.tile(track["velocity"], 2) * dt
+
+    def update(self, detections: List[Dict[str, Any]], t: float) -> int:
+        """Match detections at time t (adds "track_id" to each); returns tracks still missing."""
+        active = self._active()
+        predicted = np.array([self._predict(self.tracks[tid], t) for tid in active], dtype=np.float32).reshape(-1, 4)
+        det_boxes = np.array([d["bbox"] for d in detections], dtype=np.float32).reshape(-1, 4)
+        iou = _box_iou(predicted, det_boxes)
+        for r, tid in enumerate(active):
+            for c, det in enumerate(detections):
+                if self.tracks[tid]["class"] != det["class"]:
+                    iou[r, c] = 0.0
+
+        matched_tracks, matched_dets = set(), set()
+        for flat in np.argsort(-iou, axis=None):
+            r, c = np.unravel_index(flat, iou.shape)
+            if iou[r, c] < self.iou_threshold:
+                break
+            if r in matched_tracks or c in matched_dets:
+                continue
+            matched_tracks.add(r)
+            matched_dets.add(c)
+            self._observe(active[r], detections[c], t)
+
+        # Motion gate for what IoU missed (fast objects, velocity not known yet):
+        # same class and centre shift within max_center_shift box diagonals
+        if len(predicted) and len(det_boxes):
+            centers_t = (predicted[:, :2] + predicted[:, 2:]) / 2
+            centers_d = (det_boxes[:, :2] + det_boxes[:, 2:]) / 2
+            diag = np.hypot(predicted[:, 2] - predicted[:, 0], predicted[:, 3] - predicted[:, 1])
+            shift = np.linalg.norm(centers_t[:, None, :] - centers_d[None, :, :], axis=-1) / np.maximum(diag[:, None], 1e-9)
+            for flat in np.argsort(shift, axis=None):
+                r, c = np.unravel_index(flat, shift.shape)
+                if shift[r, c] > self.max_center_shift:
+                    break
+                if r in matched_tracks or c in matched_dets or self.tracks[active[r]]["class"] != detections[c]["class"]:
+                    continue
+                matched_tracks.add(r)
+                matched_dets.add(c)
+                self._observe(active[r], detections[c], t)
+
+        for c, det in enumerate(detections):
+            if c not in matched_dets:
+                tid = self._next_id
+                self._next_id += 1
+                self.tracks[tid] = {
+                    "class": det["class"], "bbox": np.asarray(det["bbox"], dtype=np.float32),
+                    "velocity": np.zeros(2, dtype=np.float32), "t": t, "active": True, "misses": 0,
+                    "first_seen": t, "last_seen": t, "hits": 0, "conf_sum": 0.0,
+                    "max_confidence": det["confidence"], "min_confidence": det["confidence"]
+                }
+                self._observe(tid, det, t)
+
+        missing = 0
+        for r, tid in enumerate(active):
+            if r in matched_tracks:
+                continue
+            track = self.tracks[tid]
+            track["misses"] += 1
+            if track["misses"] > self.max_misses:
+                track["active"] = False
+            else:
+                missing += 1
+        return missing
+
+    def _observe(self, tid: int, det: Dict[str, Any], t: float):
+        track = self.tracks[tid]
+        bbox = np.asarray(det["bbox"], dtype=np.float32)
+        dt = t - track["t"]
+        if track["hits"] > 0 and dt > 0:
+            old_center = (track["bbox"][:2] + track["bbox"][2:]) / 2
+            new_center = (bbox[:2] + bbox[2:]) / 2
+            track["velocity"] = (new_center - old_center) / dt
+        track.update({"bbox": bbox, "t": t, "misses": 0, "last_seen": t})
+        track["hits"] += 1
+        track["conf_sum"] += det["confidence"]
+        track["max_confidence"] = max(track["max_confidence"], det["confidence"])
+        track["min_confidence"] = min(track["min_confidence"], det["confidence"])
+        det["track_id"] = tid
+
+    def propagate(self, t: float, width: int, height: int) -> int:
+        """Advance active tracks to time t; returns how many drifted out of the frame (lost)."""
+        lost = 0
+        for tid in self._active():
+            track = self.tracks[tid]
+            box = self._predict(track, t)
+            if box[2] <= 0 or box[3] <= 0 or box[0] >= width or box[1] >= height:
+                track["active"] = False
+                lost += 1
+        return lost
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            f"track_{tid}": {
+                "class": tr["class"],
+                "first_seen": round(tr["first_seen"], 2),
+                "last_seen": round(tr["last_seen"], 2),
+                "detections": tr["hits"],
+                "max_confidence": tr["max_confidence"],
+                "min_confidence": tr["min_confidence"],
+                "avg_confidence": tr["conf_sum"] / tr["hits"] if tr["hits"] else 0.0
+            }
+            for tid, tr in self.tracks.items()
+        }
+
+def _track_video_frames(cap, frame_skip: int, frame_count: int, fps: float, width: int, height: int,
+                        conf_threshold: float, decode_stats: Dict[str, Any], progress=None) -> Dict[str, Any]:
+    """
+    Keyframe detection + IoU tracking over the sampled frames of a video.
+    The detector runs every TRACKER_KEYFRAME_INTERVAL sampled frames, when a track is
+    lost or missing, or when the scene changes; other frames only propagate tracks.
+    """
+    tracker = IoUTracker(TRACKER_IOU_THRESHOLD, TRACKER_MAX_MISSES)
+    class_summary = DetectionAggregator()
+    frame_results = []
+    total_detections = 0
+    processed = detector_calls = propagated = 0
+    since_keyframe = 0
+    force_detect = True
+    key_thumb = None
+
+    for frame_idx, frame in _iter_sampled_frames(cap, frame_skip, frame_count, decode_stats):
+        processed += 1
+        t = frame_idx / fps if fps > 0 else 0.0
+        thumb = _motion_thumbnail(frame)
+        scene_changed = key_thumb is not None and float(np.mean(np.abs(thumb - key_thumb))) > TRACKER_MOTION_THRESHOLD
+        if force_detect or scene_changed or since_keyframe >= TRACKER_KEYFRAME_INTERVAL:
+            try:
+                with stage_timer("yolo_frame"):
+                    results = run_video_model(frame, conf_threshold)
+            except Exception as e:
+                print(f"[Video] Error processing frame {frame_idx}: {e}")
+                continue
+            detector_calls += 1
+            detections = []
+            for result in results:
+                detections.extend(_collect_frame_detections(result, frame_idx, fps, conf_threshold, class_summary))
+            if progress is not None:
+                progress("detecting", processed, class_summary.summary())
+            total_detections += len(detections)
+            missing = tracker.update(detections, t)
+            if detections:
+                frame_results.append({"frame": frame_idx, "time": round(t, 2), "detections": detections})
+            force_detect = missing > 0
+            since_keyframe = 1
+            key_thumb = thumb
+        else:
+            propagated += 1
+            since_keyframe += 1
+            force_detect = tracker.propagate(t, width, height) > 0
+
+    return {
+        "detected_objects": tracker.summary(),
+        "class_summary": class_summary.summary(),
+        "frame_results": frame_results,
+        "total_detections": total_detections,
+        "processed_frames": processed,
+        "detector_calls": detector_calls,
+        "propagated_frames": propagated
+    }
+
+# -----------------------
+# Video jobs (async /infer_video)
+# -----------------------
+class VideoJobQueue:
+    """
+    Runs _process_video off the request thread on a bounded pool. Job state and results
+    are JSON files under job_dir, so a poll can be answered by any gunicorn worker, not
+    just the one running the job. Queue limits and counters are per worker process.
+    """
+
+    PROGRESS_WRITE_INTERVAL_S = 0.5
+
+    def __init__(self, workers: int, max_queued: int, job_dir: str, ttl_s: float):
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self.job_dir = job_dir
+        self.ttl_s = ttl_s
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def _ensure_executor(self):
+        # Pool threads do not survive fork, so each gunicorn worker builds its own. Call with self._lock held.
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="video-job")
+            self._pid = os.getpid()
+            self._queued = self._running = 0
+            os.makedirs(self.job_dir, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str = ".json") -> str:
+        return os.path.join(self.job_dir, job_id + suffix)
+
+    @staticmethod
+    def valid_id(job_id: str) -> bool:
+        return len(job_id) == 32 and all(c in "0123456789abcdef" for c in job_id)
+
+    def _write(self, job_id: str, doc: Dict[str, Any], suffix: str = ".json"):
+        tmp = self._path(job_id, suffix + f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(doc, f)
+        os.replace(tmp, self._path(job_id, suffix))
+
+    def _read(self, job_id: str, suffix: str = ".json") -> Dict[str, Any]:
+        try:
+            with open(self._path(job_id, suffix)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def reserve_upload_path(self, ext: str) -> Tuple[str, str]:
+        """New job id plus the path its upload should be saved to."""
+        with self._lock:
+            self._ensure_executor()
+        job_id = os.urandom(16).hex()
+        return job_id, self._path(job_id, ext)
+
+    def submit(self, job_id: str, video_path: str, params: Dict[str, Any],
+               cache_key: str = None, cache_status: str = "disabled") -> Dict[str, Any]:
+        """Queue a saved upload; returns the job document, or None if this worker's queue is full."""
+        with self._lock:
+            self._ensure_executor()
+            if self._queued + self._running >= self.workers + self.max_queued:
+                self.counters["rejected"] += 1
+                return None
+            self._queued += 1
+            self.counters["submitted"] += 1
+        doc = {
+            "job_id": job_id,
+            "status": "queued",
+            "stage": "queued",
+            "params": params,
+            "progress": {"frames_processed": 0, "frames_total": None, "percent": 0.0},
+            "detected_objects": {},
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "pid": os.getpid()
+        }
+        self._write(job_id, doc)
+        self._sweep()
+        snapshot = json.loads(json.dumps(doc))  # the pool thread mutates doc from here on
+        self._executor.submit(self._run, doc, video_path, params, cache_key, cache_status)
+        return snapshot
+
+    def complete(self, job_id: str, params: Dict[str, Any], result: Dict[str, Any]):
+        """Record an already-available result (e.g. a cache hit) as a finished job."""
+        os.makedirs(self.job_dir, exist_ok=True)
+        doc = {
+            "job_id": job_id,
+            "status": "done",
+            "stage": "done",
+            "params": params,
+            "progress": {"frames_processed": None, "frames_total": None, "percent": 100.0},
+            "detected_objects": result.get("analysis", {}).get("video_analysis", {}).get("detected_objects", {}),
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "finished_at": datetime.utcnow().isoformat() + "Z",
+            "pid": os.getpid()
+        }
+        self._write(job_id, result, ".result.json")
+        self._write(job_id, doc)
+        return doc
+
+    def _run(self, doc: Dict[str, Any], *args):
+        # Anything escaping here would vanish into the pool's future, leaving the job "running" forever
+        try:
+            self._execute(doc, *args)
+        except Exception as e:
+            print(f"[Video] Job {doc['job_id']} crashed: {e}")
+            doc.update({"status": "failed", "stage": "done", "error": "JOB_CRASHED", "message": str(e)})
+            try:
+                self._write(doc["job_id"], doc)
+            except OSError:
+                pass
+
+    def _execute(self, doc: Dict[str, Any], video_path: str, params: Dict[str, Any],
+                 cache_key: str, cache_status: str):
+        job_id = doc["job_id"]
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        last_write = 0.0
+
+        def progress(stage: str, done: int, total: int, objects: Dict[str, Any]):
+            nonlocal last_write
+            now = time.monotonic()
+            if stage == doc["stage"] and now - last_write < self.PROGRESS_WRITE_INTERVAL_S:
+                return
+            last_write = now
+            doc["stage"] = stage
+            doc["progress"] = {"frames_processed": done, "frames_total": total,
+                               "percent": round(100.0 * done / total, 1) if total else 0.0}
+            doc["detected_objects"] = json.loads(json.dumps(objects))  # snapshot; the pipeline keeps mutating it
+            self._write(job_id, doc)
+
+        start_ts = time.time()
+        doc.update({"status": "running", "stage": "starting", "started_at": datetime.utcnow().isoformat() + "Z"})
+        self._write(job_id, doc)
+        try:
+            result = _process_video(video_path, start_ts=start_ts, conf_threshold=params["conf"], mode=params["mode"],
+                                    sampling=params["sampling"], progress=progress)
+        except Exception as e:
+            result = {"success": False, "error": "PROCESSING_FAILED", "message": str(e)}
+        finally:
+            try:
+                os.remove(video_path)
+            except OSError:
+                pass
+            with self._lock:
+                self._running -= 1
+
+        if result.get("success"):
+            result["metadata"]["cache"] = cache_status
+            result["metadata"]["job_id"] = job_id
+            if cache_key is not None:
+                RESULT_CACHE.put(cache_key, result)
+            doc["detected_objects"] = result["analysis"]["video_analysis"]["detected_objects"]
+            doc["progress"]["percent"] = 100.0
+        else:
+            doc["error"] = result.get("error")
+        with self._lock:
+            self.counters["completed" if result.get("success") else "failed"] += 1
+        self._write(job_id, result, ".result.json")
+        doc.update({"status": "done" if result.get("success") else "failed", "stage": "done",
+                    "finished_at": datetime.utcnow().isoformat() + "Z",
+                    "processing_time_ms": int((time.time() - start_ts) * 1000)})
+        self._write(job_id, doc)
+        print(f"[Video] Job {job_id} {doc['status']} in {doc['processing_time_ms']}ms")
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        doc = self._read(job_id)
+        if doc is not None and doc["status"] in ("queued", "running") and not _pid_alive(doc.get("pid")):
+            # The worker that owned the job exited (restart, OOM, timeout kill)
+            doc.update({"status": "failed", "error": "WORKER_LOST"})
+        return doc
+
+    def result(self, job_id: str) -> Dict[str, Any]:
+        return self._read(job_id, ".result.json")
+
+    def _sweep(self):
+        if self.ttl_s <= 0:
+            return
+        cutoff = time.time() - self.ttl_s
+        try:
+            with os.scandir(self.job_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {"workers": self.workers, "max_queued": self.max_queued,
+                     "queued": self._queued, "running": self._running}
+            stats.update(self.counters)
+        return stats
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+VIDEO_JOBS = VideoJobQueue(VIDEO_JOB_WORKERS, VIDEO_JOB_MAX_QUEUED, VIDEO_JOB_DIR, VIDEO_JOB_TTL_S)
 
 # -----------------------
 # Endpoints
 # -----------------------
-def _process_video(video_path: str, start_ts: float = None, conf_threshold: float = 0.25) -> Dict[str, Any]:
+def _process_video(video_path: str, start_ts: float = None, conf_threshold: float = 0.25, mode: str = "detect",
+                   sampling: str = VIDEO_SAMPLING, progress=None) -> Dict[str, Any]:
     """
     Process video file using YOLO model for object detection/recognition
     Also extracts audio for emotion analysis
@@ -393,10 +3141,17 @@ def _process_video(video_path: str, start_ts: float = None, conf_threshold: floa
         video_path: Path to video file
         start_ts: Start timestamp for processing time calculation
         conf_threshold: Confidence threshold for detections (default 0.25)
+        mode: "detect" runs YOLO on every sampled frame and aggregates per class;
+              "track" detects on keyframes only and reports per-track first/last seen
+        sampling: "adaptive" skips YOLO on near-duplicate frames (detect mode only);
+                  "fixed" runs it on every frame of the duration-based sampling rate
+        progress: optional callback(stage, frames_processed, frames_total, partial_detected_objects),
+                  called as sampled frames are processed (used by async video jobs)
     """
     if start_ts is None:
         start_ts = time.time()
     
+    wait_for_model("video")
     if video_model is None:
         return {
             "success": False,
@@ -427,94 +3182,92 @@ def _process_video(video_path: str, start_ts: float = None, conf_threshold: floa
         else:
             frame_skip = max(1, int(fps / 2))  # 2 fps for long videos
         
-        detected_objects = {}  # Use dict for better tracking
+        gate = None
+        if sampling == "adaptive" and mode == "detect" and fps > 0:
+            # Read candidates at VIDEO_MAX_FPS; the gate spends the fixed tier's detector budget
+            # on the frames that changed, so YOLO calls stay within fixed sampling's (plus one second's burst)
+            budget_fps = fps / frame_skip
+            frame_skip = max(1, int(round(fps / VIDEO_MAX_FPS)))
+            gate = MotionGate(fps, VIDEO_MIN_FPS, VIDEO_MOTION_THRESHOLD, budget_fps)
+        
+        report = None
+        if progress is not None:
+            sampled_total = (frame_count + frame_skip - 1) // frame_skip
+            report = lambda stage, done, objects: progress(stage, done, sampled_total, objects)
+            report("detecting", 0, {})
+        
+        aggregator = DetectionAggregator()
         frame_results = []
         total_detections = 0
-        
-        frame_idx = 0
         processed_frame_count = 0
+        sampled_frame_count = 0
+        decode_stats = {"decoded_frames": 0, "grabbed_frames": 0, "seeks": 0, "decode_s": 0.0}
+        inference_batches = 0
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if frame_idx % frame_skip == 0:
-                processed_frame_count += 1
-                try:
-                    # Run YOLO inference with confidence threshold
-                    results = video_model(
-                        frame,
-                        conf=conf_threshold,  # Confidence threshold
-                        verbose=False,
-                        imgsz=640  # Standard YOLO input size
-                    )
-                    
-                    # Extract detections
-                    frame_detections = []
-                    for result in results:
-                        if result.boxes is not None and len(result.boxes) > 0:
-                            boxes = result.boxes
-                            for i in range(len(boxes)):
-                                cls = int(boxes.cls[i])
-                                conf = float(boxes.conf[i])
-                                class_name = video_model.names[cls]
-                                
-                                # Only include detections above threshold
-                                if conf >= conf_threshold:
-                                    bbox = boxes.xyxy[i].tolist()
-                                    
-                                    frame_detections.append({
-                                        "class": class_name,
-                                        "confidence": round(conf, 3),
-                                        "bbox": bbox
-                                    })
-                                    
-                                    total_detections += 1
-                                    
-                                    # Track unique objects with better aggregation
-                                    if class_name not in detected_objects:
-                                        detected_objects[class_name] = {
-                                            "count": 1,
-                                            "max_confidence": conf,
-                                            "min_confidence": conf,
-                                            "first_seen": round(frame_idx / fps, 2),
-                                            "last_seen": round(frame_idx / fps, 2),
-                                            "avg_confidence": conf
-                                        }
-                                    else:
-                                        obj_data = detected_objects[class_name]
-                                        obj_data["count"] += 1
-                                        obj_data["max_confidence"] = max(obj_data["max_confidence"], conf)
-                                        obj_data["min_confidence"] = min(obj_data["min_confidence"], conf)
-                                        obj_data["last_seen"] = round(frame_idx / fps, 2)
-                                        # Update average confidence
-                                        total_conf = obj_data["avg_confidence"] * (obj_data["count"] - 1) + conf
-                                        obj_data["avg_confidence"] = total_conf / obj_data["count"]
-                    
-                    if frame_detections:
-                        frame_results.append({
-                            "frame": frame_idx,
-                            "time": round(frame_idx / fps, 2),
-                            "detections": frame_detections
-                        })
-                except Exception as e:
-                    print(f"[Video] Error processing frame {frame_idx}: {e}")
+        def run_batch(batch):
+            nonlocal total_detections, inference_batches
+            try:
+                # Run YOLO inference on the whole batch of sampled frames
+                t_yolo = time.perf_counter()
+                results = run_video_model([frame for _, frame in batch], conf_threshold)
+                per_frame_s = (time.perf_counter() - t_yolo) / len(batch)
+                for _ in batch:
+                    observe_stage("yolo_frame", per_frame_s)
+                inference_batches += 1
+            except Exception as e:
+                print(f"[Video] Error processing frames {batch[0][0]}-{batch[-1][0]}: {e}")
+                return
+            for (idx, _), result in zip(batch, results):
+                frame_detections = _collect_frame_detections(result, idx, fps, conf_threshold, aggregator)
+                total_detections += len(frame_detections)
+                if frame_detections:
+                    frame_results.append({
+                        "frame": idx,
+                        "time": round(idx / fps, 2) if fps > 0 else 0.0,
+                        "detections": frame_detections
+                    })
+            if report is not None:
+                report("detecting", sampled_frame_count, aggregator.summary())
+        
+        tracking = None
+        if mode == "track":
+            tracking = _track_video_frames(cap, frame_skip, frame_count, fps, width, height, conf_threshold, decode_stats, report)
+            detected_objects = tracking["detected_objects"]
+            frame_results = tracking["frame_results"]
+            total_detections = tracking["total_detections"]
+            processed_frame_count = sampled_frame_count = tracking["processed_frames"]
+            inference_batches = tracking["detector_calls"]
+        else:
+            batch = []
+            for frame_idx, frame in _iter_sampled_frames(cap, frame_skip, frame_count, decode_stats):
+                sampled_frame_count += 1
+                if gate is not None and not gate.should_detect(frame_idx, frame):
                     continue
-            
-            frame_idx += 1
+                processed_frame_count += 1
+                batch.append((frame_idx, frame))
+                if len(batch) >= max(1, VIDEO_BATCH_SIZE):
+                    run_batch(batch)
+                    batch = []
+            if batch:
+                run_batch(batch)
+            detected_objects = aggregator.summary()
         
         cap.release()
+        decode_fps = decode_stats["decoded_frames"] / decode_stats["decode_s"] if decode_stats["decode_s"] > 0 else 0.0
         
         print(f"[Video] Processed {processed_frame_count} frames, found {total_detections} detections, {len(detected_objects)} unique objects")
         
         # Extract audio from video for emotion analysis
         audio_analysis = None
+        if report is not None:
+            report("audio", sampled_frame_count, detected_objects)  # same unit as sampled_total
         try:
+            if not wait_for_model("audio"):
+                raise RuntimeError(f"audio model is {MODEL_STATUS['audio']['state']}")
             print(f"[Video] Extracting audio from video...")
             y, sr = librosa.load(video_path, sr=BUFFER_SR, mono=True)
             if len(y) > 0:
-                audio_analysis = _process_array_and_build_response(y, sr, start_ts=start_ts)
+                audio_analysis = _analyze_audio(y, sr, start_ts=start_ts)
                 print(f"[Video] Audio analysis successful")
             else:
                 print(f"[Video] No audio track found in video")
@@ -543,7 +3296,8 @@ def _process_video(video_path: str, start_ts: float = None, conf_threshold: floa
                     "detected_objects": unique_objects,
                     "frame_detections": frame_results[:100],  # Limit to first 100 frames
                     "video_resolution": f"{width}x{height}",
-                    "confidence_threshold": conf_threshold
+                    "confidence_threshold": conf_threshold,
+                    "mode": mode
                 },
                 "audio_analysis": audio_analysis["analysis"] if audio_analysis and audio_analysis.get("success") else None
             },
@@ -555,10 +3309,24 @@ def _process_video(video_path: str, start_ts: float = None, conf_threshold: floa
                 "video_stats": {
                     "frames_processed": processed_frame_count,
                     "detections_found": total_detections,
-                    "unique_objects": len(unique_objects)
+                    "unique_objects": len(unique_objects),
+                    "frames_decoded": decode_stats["decoded_frames"],
+                    "frames_grabbed": decode_stats["grabbed_frames"],
+                    "seeks": decode_stats["seeks"],
+                    "decode_fps": round(decode_fps, 2),
+                    "inference_batches": inference_batches,
+                    "sampling": "adaptive" if gate is not None else "fixed",
+                    "frames_sampled": sampled_frame_count,
+                    "frames_skipped_low_motion": gate.skipped if gate is not None else 0,
+                    "frames_throttled": gate.throttled if gate is not None else 0
                 }
             }
         }
+        if tracking is not None:
+            response["analysis"]["video_analysis"]["class_summary"] = tracking["class_summary"]
+            response["metadata"]["video_stats"]["detector_calls"] = tracking["detector_calls"]
+            response["metadata"]["video_stats"]["propagated_frames"] = tracking["propagated_frames"]
+            response["metadata"]["video_stats"]["tracks"] = len(detected_objects)
         
         # Merge audio wellness metrics if available
         if audio_analysis and audio_analysis.get("success"):
@@ -591,184 +3359,502 @@ def _process_video(video_path: str, start_ts: float = None, conf_threshold: floa
             "traceback": error_trace
         }
 
+def _models_ready() -> bool:
+    # Audio is required; video only has to have finished loading (it may legitimately be unavailable)
+    return MODEL_STATUS["audio"]["state"] == "ready" and _model_settled["video"].is_set()
+
 @app.route("/health", methods=["GET"])
 def health():
-    video_status = "loaded" if video_model is not None else "not_loaded"
+    if video_model is not None:
+        video_status = "loaded"
+    elif MODEL_STATUS["video"]["state"] in ("pending", "loading", "warming_up"):
+        video_status = "loading"
+    else:
+        video_status = "not_loaded"
     return jsonify({
         "status": "ok",
+        "ready": _models_ready(),
         "audio_model": MODEL_NAME,
         "video_model": video_status,
-        "version": MODEL_VERSION
+        "version": MODEL_VERSION,
+        "models": MODEL_STATUS,
+        "decode_stats": decode_stats_summary(),
+        "result_cache": RESULT_CACHE.stats(),
+        "sessions": ROLLING_BUFFERS.stats(),
+        "video_jobs": VIDEO_JOBS.stats(),
+        "cpu": {"inference_threads": TORCH_THREADS, "dsp_pool": DSP_EXECUTOR.stats()}
+    }), 200
+
+@app.route("/health/live", methods=["GET"])
+def health_live():
+    """Liveness: the process is up and serving, whether or not models have loaded."""
+    return jsonify({"status": "alive"}), 200
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    """Readiness: 200 once the audio model is ready and the video model has settled, else 503."""
+    ready = _models_ready()
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "models": MODEL_STATUS
+    }), 200 if ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint. Values are per worker process (gunicorn workers do not share them)."""
+    sessions = ROLLING_BUFFERS.stats()
+    cache = RESULT_CACHE.stats()
+    lines = REQUEST_LATENCY.render() + STAGE_LATENCY.render()
+    lines += _gauge("fvatool_inference_queue_depth", "Audio clips waiting for the inference batcher.",
+                    [("", AUDIO_BATCHER.queue_depth())])
+    lines += _gauge("fvatool_rolling_sessions", "Live /infer_chunk sessions holding a rolling buffer.",
+                    [("", sessions["sessions"])])
+    lines += _gauge("fvatool_rolling_buffer_bytes", "Memory held by rolling session buffers.",
+                    [("", sessions["bytes"])])
+    lines += _gauge("fvatool_rolling_sessions_removed_total", "Sessions released, by reason.",
+                    [(f'{{reason="{k}"}}', sessions[k]) for k in ("closed", "expired", "evicted")],
+                    metric_type="counter")
+    lines += _gauge("fvatool_model_load_seconds", "Time taken to load each model.",
+                    [(f'{{model="{name}"}}', (st["load_time_ms"] or 0) / 1000.0) for name, st in MODEL_STATUS.items()])
+    lines += _gauge("fvatool_model_warmup_seconds", "Time taken by each model's warmup pass.",
+                    [(f'{{model="{name}"}}', (st["warmup_ms"] or 0) / 1000.0) for name, st in MODEL_STATUS.items()])
+    lines += _gauge("fvatool_model_ready", "1 when the model is loaded and warmed up.",
+                    [(f'{{model="{name}"}}', int(st["state"] == "ready")) for name, st in MODEL_STATUS.items()])
+    jobs = VIDEO_JOBS.stats()
+    lines += _gauge("fvatool_video_jobs", "Async video jobs in this worker, by state.",
+                    [(f'{{state="{k}"}}', jobs[k]) for k in ("queued", "running")])
+    lines += _gauge("fvatool_video_jobs_total", "Async video jobs by outcome.",
+                    [(f'{{outcome="{k}"}}', jobs[k]) for k in ("submitted", "completed", "failed", "rejected")],
+                    metric_type="counter")
+    lines += _gauge("fvatool_active_streams", "Open /stream WebSocket connections.", [("", STREAM_STATS["active"])])
+    lines += _gauge("fvatool_stream_updates_total", "Updates pushed over /stream.", [("", STREAM_STATS["updates"])],
+                    metric_type="counter")
+    lines += _gauge("fvatool_result_cache_entries", "Results held in the in-memory cache.", [("", cache["entries"])])
+    lines += _gauge("fvatool_result_cache_bytes", "Approximate size of the in-memory result cache.", [("", cache["bytes"])])
+    lines += _gauge("fvatool_result_cache_events_total", "Result cache lookups and stores by outcome.",
+                    [(f'{{event="{k}"}}', cache[k]) for k in ("memory_hits", "disk_hits", "misses", "stores", "evictions")],
+                    metric_type="counter")
+    lines += _gauge("fvatool_feature_cost_seconds", "Estimated cost of each feature estimator per second of audio.",
+                    [(f'{{algorithm="{k}"}}', v) for k, v in sorted(FEATURE_COSTS.items())])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Anonymous", "Swap")
+
+def _smaps_rollup(pid: int) -> Dict[str, int]:
+    """kB per SMAPS_FIELDS entry from /proc/<pid>/smaps_rollup (Linux 4.14+); None if unreadable."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    rollup = {}
+    for line in lines[1:]:
+        key, _, rest = line.partition(":")
+        if key in SMAPS_FIELDS:
+            rollup[key.lower() + "_kb"] = int(rest.split()[0])
+    return rollup
+
+def _proc_cmdline(pid: int) -> bytes:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _sibling_workers() -> List[int]:
+    """Other processes forked from our parent with the same command line (the other gunicorn workers)."""
+    me, ppid, cmdline = os.getpid(), os.getppid(), _proc_cmdline(os.getpid())
+    siblings = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == me:
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if parent == ppid and _proc_cmdline(int(entry)) == cmdline:
+            siblings.append(int(entry))
+    return sorted(siblings)
+
+@app.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    """
+    Shared vs private memory of this worker, its sibling workers and the master
+    (from smaps_rollup). Summed PSS is the real footprint; the average private memory
+    per worker is roughly what one more worker would cost.
+    """
+    own = _smaps_rollup(os.getpid())
+    if own is None:
+        return jsonify({"success": False, "error": "UNSUPPORTED", "message": "/proc/<pid>/smaps_rollup is not available"}), 501
+    workers = [{"pid": os.getpid(), "self": True, **own}]
+    for pid in _sibling_workers():
+        rollup = _smaps_rollup(pid)
+        if rollup is not None:
+            workers.append({"pid": pid, "self": False, **rollup})
+    master = None
+    if _proc_cmdline(os.getppid()) == _proc_cmdline(os.getpid()):
+        master = {"pid": os.getppid(), **(_smaps_rollup(os.getppid()) or {})}
+
+    def private_kb(w):
+        return w["private_clean_kb"] + w["private_dirty_kb"]
+
+    processes = workers + ([master] if master and "pss_kb" in master else [])
+    return jsonify({
+        "success": True,
+        "workers": workers,
+        "master": master,
+        "totals": {
+            "rss_kb": sum(p["rss_kb"] for p in processes),
+            "pss_kb": sum(p["pss_kb"] for p in processes),
+            "avg_worker_private_kb": int(sum(private_kb(w) for w in workers) / len(workers)),
+            "avg_worker_shared_kb": int(sum(w["shared_clean_kb"] + w["shared_dirty_kb"] for w in workers) / len(workers))
+        },
+        "config": {
+            "preload": MODEL_PRELOAD,
+            "mmap_weights": MODEL_MMAP_ACTIVE,
+            "mmap_weights_requested": MODEL_MMAP_WEIGHTS,
+            "gc_frozen_objects": gc.get_freeze_count()
+        }
     }), 200
 
 @app.route("/infer", methods=["POST"])
 def infer():
     start_ts = time.time()
-    tmp_name = None
+    if not wait_for_model("audio"):
+        return _model_not_ready_response("audio")
     try:
-        # multipart upload
-        if "audio" in request.files:
-            audio_file = request.files["audio"]
-            fname = audio_file.filename or "upload.wav"
-            file_ext = os.path.splitext(fname)[1] or ".webm"
-            
-            # Save uploaded file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-                tmp_name = tmp.name
-                audio_file.save(tmp_name)
-            
-            print(f"[Audio] Processing file: {fname}, extension: {file_ext}")
-            
-            # Load audio - librosa handles webm, wav, mp3, etc. and resamples to 16kHz
-            try:
-                # Use librosa with explicit parameters for consistent loading
-                y, sr = librosa.load(
-                    tmp_name, 
-                    sr=BUFFER_SR,  # Resample to 16kHz
-                    mono=True,      # Convert to mono
-                    duration=None,  # Load entire file
-                    offset=0.0      # Start from beginning
-                )
-                
-                # Validate audio data
-                if y is None or len(y) == 0:
-                    raise ValueError("Audio file is empty or could not be loaded")
-                
-                # Ensure it's a 1D array
-                y = np.asarray(y).flatten()
-                
-                # Check minimum length (at least 0.1 seconds)
-                min_samples = int(BUFFER_SR * 0.1)
-                if len(y) < min_samples:
-                    raise ValueError(f"Audio too short: {len(y)} samples (minimum {min_samples})")
-                
-                print(f"[Audio] Loaded: {len(y)} samples, {len(y)/sr:.2f}s, sample rate: {sr}Hz")
-                
-            except Exception as load_error:
-                print(f"[Audio] Librosa load failed: {load_error}, trying soundfile fallback...")
-                # If librosa fails, try with soundfile as fallback
-                try:
-                    import soundfile as sf
-                    y, sr = sf.read(tmp_name)
-                    
-                    # Validate loaded data
-                    if y is None or len(y) == 0:
-                        raise ValueError("Audio file is empty")
-                    
-                    # Convert to mono if stereo
-                    if len(y.shape) > 1:
-                        y = librosa.to_mono(y)
-                    
-                    # Resample if needed
-                    if sr != BUFFER_SR:
-                        y = librosa.resample(y, orig_sr=sr, target_sr=BUFFER_SR)
-                        sr = BUFFER_SR
-                    
-                    # Ensure it's a 1D array
-                    y = np.asarray(y).flatten()
-                    
-                    print(f"[Audio] Loaded via soundfile: {len(y)} samples, {len(y)/sr:.2f}s, sample rate: {sr}Hz")
-                    
-                except Exception as sf_error:
-                    print(f"[Audio] Soundfile fallback also failed: {sf_error}")
-                    raise ValueError(f"Could not load audio file: {load_error}, fallback error: {sf_error}")
-        # base64 fallback
-        elif request.form.get("audio_base64"):
-            b64 = request.form.get("audio_base64")
-            if b64.startswith("data:"):
-                b64 = b64.split(",", 1)[1]
-            audio_bytes = base64.b64decode(b64)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                tmp_name = tmp.name
-                tmp.write(audio_bytes)
-            y, sr = librosa.load(tmp_name, sr=BUFFER_SR)
-        else:
-            return jsonify({"success": False, "error": "NO_AUDIO", "message": "Provide multipart 'audio' file or 'audio_base64'."}), 400
+        with stage_timer("upload_save"):
+            audio_bytes, fname = _read_audio_payload("upload.wav")
+        if audio_bytes is None:
+            return _respond({"success": False, "error": "NO_AUDIO", "message": "Provide multipart 'audio' file or 'audio_base64'."}, 400)
+
+        print(f"[Audio] Processing upload: {fname or 'base64'}, {len(audio_bytes)} bytes")
+
+        # long_audio: "auto" (windows above LONG_AUDIO_AUTO_S), "1" to force windows, "0" for a single pass
+        long_audio = request.values.get("long_audio", "auto").lower()
+        # vad: "1" to send only speech regions to the model, "0" for the whole clip (default VAD_ENABLED)
+        vad = _vad_wanted(request.values.get("vad"))
+        # profile: which acoustic features run (live | standard | full); latency_budget_ms drops optional ones under load
+        try:
+            profile, latency_budget_ms = _feature_params(request.values)
+        except ValueError as e:
+            return _respond({"success": False, "error": "INVALID_PROFILE", "message": str(e)}, 400)
+
+        cache_key = None
+        if _cache_wanted():
+            cache_key = ResultCache.make_key("infer", hashlib.sha256(audio_bytes).hexdigest(), long_audio=long_audio, vad=vad,
+                                             profile=profile)
+            cached, tier = RESULT_CACHE.get(cache_key)
+            if cached is not None:
+                return _respond(_serve_cached(cached, tier, start_ts))
+
+        # Decode straight from the request bytes and resample to 16kHz mono in one pass
+        y, sr, decode_info = decode_audio_bytes(audio_bytes, fname, target_sr=BUFFER_SR)
+
+        # Check minimum length (at least 0.1 seconds)
+        min_samples = int(BUFFER_SR * 0.1)
+        if len(y) < min_samples:
+            raise ValueError(f"Audio too short: {len(y)} samples (minimum {min_samples})")
 
-        resp = _process_array_and_build_response(y, sr, start_ts=start_ts)
-        return jsonify(resp), 200
+        print(f"[Audio] Decoded {decode_info['format']} via {decode_info['method']}: {len(y)} samples, {len(y)/sr:.2f}s in {decode_info['total_ms']}ms")
+
+        resp = _analyze_audio(y, sr, start_ts=start_ts, long_audio=long_audio, vad=vad, profile=profile,
+                              latency_budget_ms=latency_budget_ms)
+        resp["metadata"]["decode"] = decode_info
+        resp["metadata"]["cache"] = _cache_status()
+        degraded = resp["metadata"].get("feature_profile", {})
+        if cache_key is not None and not (degraded.get("skipped") or degraded.get("downgraded")):
+            RESULT_CACHE.put(cache_key, resp)
+        return _respond(resp)
 
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         print(f"[Audio] Processing failed: {e}")
         print(f"[Audio] Traceback: {error_trace}")
-        return jsonify({
+        return _respond({
             "success": False, 
             "error": "PROCESSING_FAILED", 
             "message": str(e),
             "details": error_trace.split('\n')[-2] if len(error_trace.split('\n')) > 1 else str(e)
-        }), 500
-    finally:
-        try:
-            if tmp_name and os.path.exists(tmp_name):
-                os.remove(tmp_name)
-        except Exception:
-            pass
+        }, 500)
 
 @app.route("/infer_chunk", methods=["POST"])
 def infer_chunk():
     start_ts = time.time()
-    tmp_name = None
+    if not wait_for_model("audio"):
+        return _model_not_ready_response("audio")
     try:
         session_id = request.form.get("session_id", None)
         include_buffer_seconds = int(request.form.get("include_buffer_seconds", 0))
+        vad = _vad_wanted(request.form.get("vad"))
+        try:
+            profile, latency_budget_ms = _feature_params(request.form, FEATURE_PROFILE_LIVE)
+        except ValueError as e:
+            return _respond({"success": False, "error": "INVALID_PROFILE", "message": str(e)}, 400)
 
         # get chunk
-        if "audio" in request.files:
-            audio_file = request.files["audio"]
-            fname = audio_file.filename or "chunk.wav"
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(fname)[1] or ".wav") as tmp:
-                tmp_name = tmp.name
-                audio_file.save(tmp_name)
-            y_chunk, sr = librosa.load(tmp_name, sr=BUFFER_SR)
-        elif request.form.get("audio_base64"):
-            b64 = request.form.get("audio_base64")
-            if b64.startswith("data:"):
-                b64 = b64.split(",", 1)[1]
-            audio_bytes = base64.b64decode(b64)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                tmp_name = tmp.name
-                tmp.write(audio_bytes)
-            y_chunk, sr = librosa.load(tmp_name, sr=BUFFER_SR)
-        else:
-            return jsonify({"success": False, "error": "NO_AUDIO_CHUNK"}), 400
+        with stage_timer("upload_save"):
+            audio_bytes, fname = _read_audio_payload("chunk.wav")
+        if audio_bytes is None:
+            return _respond({"success": False, "error": "NO_AUDIO_CHUNK"}, 400)
+        y_chunk, sr, decode_info = decode_audio_bytes(audio_bytes, fname, target_sr=BUFFER_SR)
 
-        # update rolling buffer
-        if session_id:
-            buf = ROLLING_BUFFERS.get(session_id)
-            if buf is None:
-                buf = deque()
-                ROLLING_BUFFERS[session_id] = buf
-            buf.append(y_chunk)
-            # trim buffer to MAX_BUFFER_SECONDS
-            total_len = sum(len(a) for a in buf)
-            while (total_len / float(BUFFER_SR)) > MAX_BUFFER_SECONDS and len(buf) > 0:
-                removed = buf.popleft()
-                total_len = sum(len(a) for a in buf)
-
-        # assemble input: either buffered concat or just chunk
-        if session_id and include_buffer_seconds and session_id in ROLLING_BUFFERS:
-            parts = list(ROLLING_BUFFERS[session_id])
-            y = np.concatenate(parts) if len(parts) > 0 else y_chunk
+        # update rolling buffer (ring buffer keeps the last MAX_BUFFER_SECONDS)
+        buf = ROLLING_BUFFERS.append(session_id, y_chunk) if session_id else None
+
+        # assemble input: either the buffered window or just the chunk
+        if buf is not None and include_buffer_seconds:
+            y = buf.snapshot()  # read after the lock is released, while other chunks may append
+            if len(y) == 0:
+                y = y_chunk
         else:
             y = y_chunk
 
-        resp = _process_array_and_build_response(y, sr, start_ts=start_ts)
+        resp = _process_array_and_build_response(y, sr, start_ts=start_ts, vad=vad, profile=profile,
+                                                 latency_budget_ms=latency_budget_ms)
+        resp["metadata"]["decode"] = decode_info
         # add chunk id & include session_id echo
         resp["chunk_id"] = f"chunk_{int(time.time()*1000)}"
         if session_id:
             resp["session_id"] = session_id
-        return jsonify(resp), 200
+        return _respond(resp)
 
     except Exception as e:
-        return jsonify({"success": False, "error": "CHUNK_PROCESSING_FAILED", "message": str(e)}), 500
-    finally:
+        return _respond({"success": False, "error": "CHUNK_PROCESSING_FAILED", "message": str(e)}, 500)
+
+@app.route("/close_session", methods=["POST"])
+def close_session():
+    """Release a session's rolling buffer as soon as the client is done with it."""
+    payload = request.get_json(silent=True) or {}
+    session_id = request.form.get("session_id") or payload.get("session_id")
+    if not session_id:
+        return jsonify({"success": False, "error": "NO_SESSION_ID"}), 400
+    closed = ROLLING_BUFFERS.close(session_id)
+    return jsonify({"success": True, "session_id": session_id, "closed": closed}), 200
+
+STREAM_STATS = {"active": 0, "opened": 0, "updates": 0}
+_stream_stats_lock = threading.Lock()
+
+def _count_stream(key: str, delta: int = 1):
+    with _stream_stats_lock:
+        STREAM_STATS[key] += delta
+
+def _serve_audio_stream(ws, args) -> None:
+    """
+    One live audio stream over a WebSocket.
+    Query args: session_id, format (s16le | f32le | webm | ogg), sample_rate (PCM only),
+    update_ms, keep_session, vad, profile, latency_budget_ms, fields, verbosity.
+    Binary messages carry audio and are appended to the session's rolling buffer; text
+    messages may be {"type": "flush"} to push an update now or {"type": "close"} to end the stream. The server sends JSON "ready", "update" and "error" messages.
+    """
+    def send(payload: Dict[str, Any]):
+        ws.send(app.json.dumps(payload))
+
+    def send_error(error: str, message: str):
+        send({"type": "error", "success": False, "error": error, "message": message})
+
+    if not wait_for_model("audio"):
+        state = MODEL_STATUS["audio"]["state"]
+        send_error("MODEL_LOADING" if state in ("pending", "loading", "warming_up") else "MODEL_UNAVAILABLE",
+                   f"audio model is {state}")
+        return
+    session_id = args.get("session_id") or f"stream_{int(time.time()*1000)}_{os.urandom(4).hex()}"
+    keep_session = args.get("keep_session", "0") in ("1", "true", "yes")
+    vad = _vad_wanted(args.get("vad"))
+    try:
+        update_s = max(STREAM_MIN_UPDATE_MS, int(args.get("update_ms", STREAM_UPDATE_MS))) / 1000.0
+        profile, latency_budget_ms = _feature_params(args, FEATURE_PROFILE_LIVE)
+        decoder = StreamingAudioDecoder(args.get("format", "s16le").lower(), int(args.get("sample_rate", BUFFER_SR)))
+    except ValueError as e:
+        send_error("INVALID_STREAM", str(e))
+        return
+
+    _count_stream("active")
+    _count_stream("opened")
+    send({"type": "ready", "session_id": session_id, "format": decoder.fmt, "sample_rate": decoder.sample_rate,
+          "update_ms": int(update_s * 1000)})
+    seq = 0
+    samples_received = 0
+    new_samples = 0
+    last_update = float("-inf")  # the first update goes out as soon as there is enough audio
+    min_new = int(STREAM_MIN_NEW_AUDIO_S * BUFFER_SR)
+    buf = None
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                continue
+            force = False
+            if isinstance(message, str):
+                try:
+                    control = json.loads(message)
+                except ValueError:
+                    control = {}
+                kind = control.get("type") if isinstance(control, dict) else None
+                if kind == "close":
+                    break
+                if kind != "flush":
+                    send_error("INVALID_MESSAGE", "text messages must be {\"type\": \"flush\"} or {\"type\": \"close\"}")
+                    continue
+                force = True
+            else:
+                if len(message) > STREAM_MAX_MESSAGE_BYTES:
+                    send_error("FRAME_TOO_LARGE", f"frames are limited to {STREAM_MAX_MESSAGE_BYTES} bytes")
+                    continue
+                with stage_timer("decode"):
+                    y = decoder.feed(message)
+                if len(y):
+                    buf = ROLLING_BUFFERS.append(session_id, y)
+                    samples_received += len(y)
+                    new_samples += len(y)
+
+            due = time.perf_counter() - last_update >= update_s and new_samples >= min_new
+            if buf is None or not (due or (force and new_samples > 0)):
+                continue
+            update_started = time.time()
+            window = buf.snapshot()
+            if len(window) < int(BUFFER_SR * 0.1):
+                continue
+            resp = _process_array_and_build_response(window, BUFFER_SR, start_ts=update_started, vad=vad, profile=profile,
+                                                     latency_budget_ms=latency_budget_ms)
+            seq += 1
+            new_samples = 0
+            last_update = time.perf_counter()
+            _count_stream("updates")
+            resp.update({
+                "type": "update",
+                "seq": seq,
+                "session_id": session_id,
+                "buffered_seconds": round(len(window) / BUFFER_SR, 2),
+                "received_seconds": round(samples_received / BUFFER_SR, 2)
+            })
+            send(shape_response(resp, args.get("fields"), args.get("verbosity")))
+    except Exception as e:
+        if ConnectionClosed is not None and isinstance(e, ConnectionClosed):
+            raise  # the client went away; nobody to tell
+        import traceback
+        print(f"[Stream] {session_id} failed: {e}")
+        print(f"[Stream] Traceback: {traceback.format_exc()}")
         try:
-            if tmp_name and os.path.exists(tmp_name):
-                os.remove(tmp_name)
+            send_error("PROCESSING_FAILED", str(e))
         except Exception:
-            pass
+            pass  # socket already unusable; the original error has been logged
+    finally:
+        _count_stream("active", -1)
+        decoder.close()
+        if not keep_session:
+            ROLLING_BUFFERS.close(session_id)
+        print(f"[Stream] {session_id} closed after {samples_received / BUFFER_SR:.1f}s of audio, {seq} updates")
+
+if sock is not None:
+    @sock.route("/stream")
+    def stream(ws):
+        _serve_audio_stream(ws, request.args)
+
+def _frame_detections(results, frame_width: int, frame_height: int, conf_threshold: float) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Per-frame detections with normalized bounding boxes, plus a per-class summary, from YOLO results."""
+    aggregator = DetectionAggregator(with_seen=False)
+    detections = []  # List of all detections with bounding boxes
+    names = video_model.names
+    scale = np.array([frame_width, frame_height, frame_width, frame_height], dtype=np.float64)
+
+    for result in results:
+        cls, conf, xyxy = _result_arrays(result, conf_threshold)
+        if len(cls) == 0:
+            continue
+        aggregator.add(cls, conf)
+        # Normalize coordinates to [0, 1] range for frontend scaling
+        normalized = (xyxy.astype(np.float64) / scale).tolist()
+        detections.extend(
+            {
+                "class": names[c],
+                "confidence": round(p, 3),
+                "bbox": norm,  # Normalized [x1, y1, x2, y2]
+                "bbox_pixel": bbox  # Original pixel coordinates
+            }
+            for c, p, norm, bbox in zip(cls.tolist(), conf.tolist(), normalized, xyxy.tolist())
+        )
+
+    return aggregator.summary(), detections
+
+def _decode_frame(data: bytes) -> np.ndarray:
+    """BGR image from encoded bytes, or None when they are empty or not a decodable image."""
+    if not data:
+        return None  # cv2.imdecode asserts on an empty buffer instead of returning None
+    try:
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+
+class LatestFrameSlot:
+    """
+    Per-client gate for /infer_frame. One frame per client runs detection at a time;
+    frames arriving meanwhile wait, and each new arrival supersedes the ones already
+    waiting, so when the detector frees up it always gets the newest frame.
+
+    Slots live in one worker process, so frames are only superseded by frames that
+    the same worker is serving concurrently: this needs threaded workers (gunicorn
+    --worker-class gthread --threads N, as in render.yaml). With sync workers each
+    process holds one request at a time and frames_dropped stays 0.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = 0
+        self._busy = False
+        self.frames_dropped = 0
+        self.last_used = time.monotonic()
+
+    def acquire(self) -> bool:
+        """Wait for the detector; False if a newer frame arrived first (this one is dropped)."""
+        with self._cond:
+            self._latest += 1
+            seq = self._latest
+            self.last_used = time.monotonic()
+            self._cond.notify_all()  # wake older waiters so they can drop out now
+            while self._busy and self._latest == seq:
+                self._cond.wait()
+            if self._latest != seq:
+                self.frames_dropped += 1
+                return False
+            self._busy = True
+            return True
+
+    def release(self):
+        with self._cond:
+            self._busy = False
+            self.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    def idle(self) -> bool:
+        return not self._busy and time.monotonic() - self.last_used > FRAME_SLOT_IDLE_S
+
+
+FRAME_SLOT_IDLE_S = 60.0  # forget a client's slot after this long without frames
+FRAME_SLOTS = {}  # client_id -> LatestFrameSlot (per worker process; see LatestFrameSlot)
+_frame_slots_lock = threading.Lock()
+
+def _frame_slot(client_id: str) -> LatestFrameSlot:
+    with _frame_slots_lock:
+        slot = FRAME_SLOTS.get(client_id)
+        if slot is None:
+            for stale in [cid for cid, s in FRAME_SLOTS.items() if s.idle()]:
+                del FRAME_SLOTS[stale]
+            slot = FRAME_SLOTS[client_id] = LatestFrameSlot()
+        return slot
+
+def _frame_staleness(start_ts: float) -> Dict[str, Any]:
+    """Age of the result: since the request arrived, and since capture when the client sent captured_at (epoch ms)."""
+    now_ms = time.time() * 1000
+    staleness = {"staleness_ms": round(now_ms - start_ts * 1000, 1)}
+    try:
+        captured_at = float(request.form.get("captured_at", ""))
+        staleness["capture_staleness_ms"] = round(now_ms - captured_at, 1)
+    except ValueError:
+        pass
+    return staleness
 
 @app.route("/infer_frame", methods=["POST"])
 def infer_frame():
@@ -777,120 +3863,183 @@ def infer_frame():
     Accepts image frames and returns object detection results
     """
     start_ts = time.time()
-    tmp_name = None
+    slot_held = False
     try:
         if "frame" not in request.files:
-            return jsonify({
+            return _respond({
                 "success": False,
                 "error": "NO_FRAME",
                 "message": "Provide multipart 'frame' file."
-            }), 400
+            }, 400)
         
         # Get confidence threshold from request (default 0.25)
         conf_threshold = float(request.form.get("conf", 0.25))
         conf_threshold = max(0.0, min(1.0, conf_threshold))
         
-        if video_model is None:
-            return jsonify({
+        # Live frames never wait for a loading model
+        if not wait_for_model("video", timeout=0):
+            return _respond({
                 "success": False,
-                "error": "VIDEO_MODEL_NOT_LOADED",
+                "error": "MODEL_LOADING" if MODEL_STATUS["video"]["state"] in ("pending", "loading", "warming_up") else "VIDEO_MODEL_NOT_LOADED",
                 "detected_objects": {}
-            }), 200  # Return 200 to not break live recording
+            }, 200)  # Return 200 to not break live recording
         
-        frame_file = request.files["frame"]
+        with stage_timer("upload_save"):
+            frame_bytes = request.files["frame"].read()
         
-        # Save frame to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            tmp_name = tmp.name
-            frame_file.save(tmp_name)
+        cache_key = None
+        if _cache_wanted():
+            cache_key = ResultCache.make_key("infer_frame", hashlib.sha256(frame_bytes).hexdigest(), conf=conf_threshold)
+            cached, tier = RESULT_CACHE.get(cache_key)
+            if cached is not None:
+                return _respond(_serve_cached(cached, tier, start_ts))
+        
+        # Latest-frame-wins: while this client's previous frame is still in YOLO, only the newest waiting frame survives
+        client_id = request.form.get("client_id")
+        slot = _frame_slot(client_id) if client_id else None
+        if slot is not None and not slot.acquire():
+            return _respond({
+                "success": False,
+                "error": "FRAME_SUPERSEDED",
+                "message": "A newer frame from this client arrived while this one was waiting",
+                "detected_objects": {},
+                "metadata": {"frames_dropped": slot.frames_dropped, **_frame_staleness(start_ts)}
+            }, 200)  # Return 200 to not break live recording
+        queue_ms = round((time.time() - start_ts) * 1000, 1)
+        slot_held = slot is not None
         
-        # Read frame using OpenCV
-        frame = cv2.imread(tmp_name)
+        # Decode straight from the request bytes
+        with stage_timer("decode"):
+            frame = _decode_frame(frame_bytes)
         if frame is None:
-            return jsonify({
+            return _respond({
                 "success": False,
                 "error": "INVALID_FRAME",
                 "detected_objects": {}
-            }), 200
+            }, 200)
+        
+        frame_height, frame_width = frame.shape[:2]
         
         # Run YOLO inference
-        results = video_model(frame, conf=conf_threshold, verbose=False, imgsz=640)
+        with stage_timer("yolo_frame"):
+            results = run_video_model(frame, conf_threshold)
+        if slot_held:
+            slot.release()
+            slot_held = False
         
         # Extract detections with bounding boxes
-        detected_objects = {}
-        detections = []  # List of all detections with bounding boxes
-        
-        for result in results:
-            if result.boxes is not None and len(result.boxes) > 0:
-                boxes = result.boxes
-                frame_height, frame_width = frame.shape[:2]
-                
-                for i in range(len(boxes)):
-                    cls = int(boxes.cls[i])
-                    conf = float(boxes.conf[i])
-                    class_name = video_model.names[cls]
-                    
-                    if conf >= conf_threshold:
-                        # Get bounding box coordinates (x1, y1, x2, y2)
-                        bbox = boxes.xyxy[i].cpu().numpy().tolist()
-                        x1, y1, x2, y2 = bbox
-                        
-                        # Normalize coordinates to [0, 1] range for frontend scaling
-                        normalized_bbox = [
-                            x1 / frame_width,   # x1 normalized
-                            y1 / frame_height,  # y1 normalized
-                            x2 / frame_width,   # x2 normalized
-                            y2 / frame_height   # y2 normalized
-                        ]
-                        
-                        # Add detection with bounding box
-                        detection = {
-                            "class": class_name,
-                            "confidence": round(conf, 3),
-                            "bbox": normalized_bbox,  # Normalized [x1, y1, x2, y2]
-                            "bbox_pixel": bbox  # Original pixel coordinates
-                        }
-                        detections.append(detection)
-                        
-                        # Aggregate for summary
-                        if class_name not in detected_objects:
-                            detected_objects[class_name] = {
-                                "count": 1,
-                                "max_confidence": conf,
-                                "avg_confidence": conf
-                            }
-                        else:
-                            obj_data = detected_objects[class_name]
-                            obj_data["count"] += 1
-                            obj_data["max_confidence"] = max(obj_data["max_confidence"], conf)
-                            total_conf = obj_data["avg_confidence"] * (obj_data["count"] - 1) + conf
-                            obj_data["avg_confidence"] = total_conf / obj_data["count"]
+        detected_objects, detections = _frame_detections(results, frame_width, frame_height, conf_threshold)
         
         processing_time_ms = int((time.time() - start_ts) * 1000)
         
-        return jsonify({
+        resp = {
             "success": True,
             "detected_objects": detected_objects,
             "detections": detections,  # All detections with bounding boxes
             "frame_size": {"width": frame_width, "height": frame_height},
-            "processing_time_ms": processing_time_ms
-        }), 200
+            "processing_time_ms": processing_time_ms,
+            "metadata": {"cache": _cache_status()}
+        }
+        if cache_key is not None:
+            RESULT_CACHE.put(cache_key, resp)
+        if slot is not None:
+            resp = dict(resp, metadata=dict(resp["metadata"], frames_dropped=slot.frames_dropped,
+                                            queue_ms=queue_ms, **_frame_staleness(start_ts)))
+        return _respond(resp)
         
     except Exception as e:
         import traceback
         print(f"[Frame] Processing failed: {e}")
-        return jsonify({
+        return _respond({
             "success": False,
             "error": "FRAME_PROCESSING_FAILED",
             "message": str(e),
             "detected_objects": {}
-        }), 200  # Return 200 to not break live recording
+        }, 200)  # Return 200 to not break live recording
     finally:
-        try:
-            if tmp_name and os.path.exists(tmp_name):
-                os.remove(tmp_name)
-        except Exception:
-            pass
+        if slot_held:
+            slot.release()
+
+@app.route("/infer_frames", methods=["POST"])
+def infer_frames():
+    """
+    Batch variant of /infer_frame: several frames (multipart 'frames', repeated), possibly
+    from different cameras or clients, go through YOLO in one call. Optional repeated
+    'frame_ids' label the frames (default: the upload filenames). Results come back in
+    upload order with the same per-frame fields as /infer_frame.
+    """
+    start_ts = time.time()
+    try:
+        uploads = request.files.getlist("frames") or request.files.getlist("frame")
+        if not uploads:
+            return _respond({
+                "success": False,
+                "error": "NO_FRAMES",
+                "message": "Provide one or more multipart 'frames' files."
+            }, 400)
+        if len(uploads) > FRAME_BATCH_MAX:
+            return _respond({
+                "success": False,
+                "error": "TOO_MANY_FRAMES",
+                "message": f"At most {FRAME_BATCH_MAX} frames per request."
+            }, 400)
+        
+        conf_threshold = float(request.form.get("conf", 0.25))
+        conf_threshold = max(0.0, min(1.0, conf_threshold))
+        frame_ids = request.form.getlist("frame_ids")
+        
+        if not wait_for_model("video", timeout=0):
+            return _respond({
+                "success": False,
+                "error": "MODEL_LOADING" if MODEL_STATUS["video"]["state"] in ("pending", "loading", "warming_up") else "VIDEO_MODEL_NOT_LOADED",
+                "frames": []
+            }, 200)  # Return 200 to not break live recording
+        
+        frames_out = []
+        decoded = []  # (index in frames_out, image)
+        with stage_timer("decode"):
+            for i, upload in enumerate(uploads):
+                frame_id = frame_ids[i] if i < len(frame_ids) else (upload.filename or str(i))
+                frame = _decode_frame(upload.read())
+                if frame is None:
+                    frames_out.append({"frame_id": frame_id, "success": False, "error": "INVALID_FRAME", "detected_objects": {}})
+                    continue
+                frames_out.append({"frame_id": frame_id})
+                decoded.append((i, frame))
+        
+        inference_ms = 0.0
+        if decoded:
+            t_yolo = time.perf_counter()
+            results = run_video_model([frame for _, frame in decoded], conf_threshold)
+            inference_ms = (time.perf_counter() - t_yolo) * 1000
+            for _ in decoded:
+                observe_stage("yolo_frame", inference_ms / 1000.0 / len(decoded))
+            for (i, frame), result in zip(decoded, results):
+                frame_height, frame_width = frame.shape[:2]
+                detected_objects, detections = _frame_detections([result], frame_width, frame_height, conf_threshold)
+                frames_out[i].update({
+                    "success": True,
+                    "detected_objects": detected_objects,
+                    "detections": detections,
+                    "frame_size": {"width": frame_width, "height": frame_height}
+                })
+        
+        return _respond({
+            "success": True,
+            "frames": frames_out,
+            "frame_count": len(frames_out),
+            "processing_time_ms": int((time.time() - start_ts) * 1000),
+            "metadata": {"inference_ms": round(inference_ms, 1), "batch_size": len(decoded)}
+        })
+        
+    except Exception as e:
+        print(f"[Frame] Batch processing failed: {e}")
+        return _respond({
+            "success": False,
+            "error": "FRAME_PROCESSING_FAILED",
+            "message": str(e),
+            "frames": []
+        }, 200)  # Return 200 to not break live recording
 
 @app.route("/infer_video", methods=["POST"])
 def infer_video():
@@ -900,42 +4049,101 @@ def infer_video():
     
     Query parameters:
     - conf: Confidence threshold (default 0.25, range 0.0-1.0)
+    - mode: "detect" (default, per-class summary) or "track" (keyframe detection + IoU tracks)
+    - sampling: "adaptive" (default, skip YOLO on near-duplicate frames) or "fixed"
+    - async: "1" to return a job id right away (202) and poll /video_jobs/<job_id>
     """
     start_ts = time.time()
     tmp_name = None
     try:
         if "video" not in request.files:
-            return jsonify({
+            return _respond({
                 "success": False,
                 "error": "NO_VIDEO",
                 "message": "Provide multipart 'video' file."
-            }), 400
+            }, 400)
         
         # Get confidence threshold from request (default 0.25)
         conf_threshold = float(request.form.get("conf", 0.25))
         conf_threshold = max(0.0, min(1.0, conf_threshold))  # Clamp between 0 and 1
+        mode = request.form.get("mode", "detect")
+        if mode not in ("detect", "track"):
+            return _respond({
+                "success": False,
+                "error": "INVALID_MODE",
+                "message": "mode must be 'detect' or 'track'."
+            }, 400)
         
         video_file = request.files["video"]
         fname = video_file.filename or "upload.mp4"
         file_ext = os.path.splitext(fname)[1] or ".mp4"
         
+        sampling = request.form.get("sampling", VIDEO_SAMPLING).lower()
+        if sampling not in ("adaptive", "fixed"):
+            return _respond({
+                "success": False,
+                "error": "INVALID_SAMPLING",
+                "message": "sampling must be 'adaptive' or 'fixed'."
+            }, 400)
+        job_params = {"conf": conf_threshold, "mode": mode, "sampling": sampling}
+        run_async = request.values.get("async", "0") in ("1", "true", "yes")
+        
         print(f"[Video] Received video file: {fname}, confidence threshold: {conf_threshold}")
         
-        # Save uploaded video to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            tmp_name = tmp.name
-            video_file.save(tmp_name)
+        # Save uploaded video to temp file (or the job's upload path), hashing it on the way for the result cache
+        hasher = hashlib.sha256()
+        if run_async:
+            job_id, tmp_name = VIDEO_JOBS.reserve_upload_path(file_ext)
+            upload = open(tmp_name, "wb")
+        else:
+            upload = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
+            tmp_name = upload.name
+        with stage_timer("upload_save"), upload as tmp:
+            while True:
+                block = video_file.stream.read(1024 * 1024)
+                if not block:
+                    break
+                hasher.update(block)
+                tmp.write(block)
+        
+        cache_key = None
+        if _cache_wanted():
+            cache_key = ResultCache.make_key("infer_video", hasher.hexdigest(), conf=conf_threshold, mode=mode, sampling=sampling,
+                                           vad=VAD_ENABLED, profile=FEATURE_PROFILE)
+            cached, tier = RESULT_CACHE.get(cache_key)
+            if cached is not None:
+                if run_async:
+                    cached = _serve_cached(cached, tier, start_ts)
+                    cached["metadata"]["job_id"] = job_id
+                    return _respond(_video_job_response(VIDEO_JOBS.complete(job_id, job_params, cached)), 202)
+                return _respond(_serve_cached(cached, tier, start_ts))
+        
+        if run_async:
+            job = VIDEO_JOBS.submit(job_id, tmp_name, job_params, cache_key, _cache_status())
+            if job is None:
+                return _respond({
+                    "success": False,
+                    "error": "QUEUE_FULL",
+                    "message": "Too many video jobs in progress, retry later.",
+                    "video_jobs": VIDEO_JOBS.stats()
+                }, 429), {"Retry-After": "10"}
+            tmp_name = None  # the job owns the upload now and removes it when done
+            return _respond(_video_job_response(job), 202)
         
         # Process video with confidence threshold
-        resp = _process_video(tmp_name, start_ts=start_ts, conf_threshold=conf_threshold)
-        return jsonify(resp), 200
+        resp = _process_video(tmp_name, start_ts=start_ts, conf_threshold=conf_threshold, mode=mode, sampling=sampling)
+        if resp.get("success"):
+            resp["metadata"]["cache"] = _cache_status()
+            if cache_key is not None:
+                RESULT_CACHE.put(cache_key, resp)
+        return _respond(resp)
         
     except Exception as e:
-        return jsonify({
+        return _respond({
             "success": False,
             "error": "PROCESSING_FAILED",
             "message": str(e)
-        }), 500
+        }, 500)
     finally:
         try:
             if tmp_name and os.path.exists(tmp_name):
@@ -943,10 +4151,171 @@ def infer_video():
         except Exception:
             pass
 
+def _video_job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    public = {k: v for k, v in job.items() if k != "pid"}
+    public.update({
+        "success": True,
+        "status_url": f"/video_jobs/{job['job_id']}",
+        "result_url": f"/video_jobs/{job['job_id']}/result"
+    })
+    return public
+
+@app.route("/video_jobs/<job_id>", methods=["GET"])
+def video_job_status(job_id: str):
+    """Progress of an async video job: status, stage, frames processed / total and partial detected_objects."""
+    job = VIDEO_JOBS.status(job_id) if VideoJobQueue.valid_id(job_id) else None
+    if job is None:
+        return _respond({"success": False, "error": "JOB_NOT_FOUND"}, 404)
+    return _respond(_video_job_response(job))
+
+@app.route("/video_jobs/<job_id>/result", methods=["GET"])
+def video_job_result(job_id: str):
+    """The /infer_video response of a finished job; 202 with the job status while it is still running."""
+    job = VIDEO_JOBS.status(job_id) if VideoJobQueue.valid_id(job_id) else None
+    if job is None:
+        return _respond({"success": False, "error": "JOB_NOT_FOUND"}, 404)
+    if job["status"] in ("queued", "running"):
+        return _respond(_video_job_response(job), 202)
+    result = VIDEO_JOBS.result(job_id)
+    if result is None:
+        return _respond({"success": False, "error": job.get("error") or "RESULT_MISSING", "job_id": job_id}, 200)
+    return _respond(result)
+
+# Models load in the background so the worker can answer /health immediately
+# (or, with MODEL_PRELOAD, synchronously in the gunicorn master before workers fork)
+CLI_SUBCOMMANDS = ("export-onnx",)  # load their own models, so the server models are skipped
+
+def _cli_subcommand() -> str:
+    """The `python FVATool.py <subcommand>` being run, if any; server flags do not count."""
+    if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in CLI_SUBCOMMANDS:
+        return sys.argv[1]
+    return None
+
+if MODEL_AUTOLOAD and not _cli_subcommand() and not _is_pool_child():
+    if MODEL_PRELOAD:
+        preload_models()
+    else:
+        start_model_loading()
+
+# -----------------------
+# ONNX export / verification
+# -----------------------
+def _verification_clips(samples_dir: str = None) -> List[np.ndarray]:
+    """Deterministic tones, noise and speech-like bursts, plus any audio files in samples_dir."""
+    rng = np.random.default_rng(1234)
+    clips = []
+    for seconds in (0.5, 1.0, 2.0, 4.0):
+        t = np.arange(int(BUFFER_SR * seconds)) / BUFFER_SR
+        for f0 in (110.0, 220.0):
+            clips.append(0.3 * np.sin(2 * np.pi * f0 * t))
+        clips.append(0.1 * rng.standard_normal(len(t)))
+        envelope = (np.sin(2 * np.pi * 4.0 * t) > 0).astype(np.float64)
+        clips.append(envelope * 0.3 * np.sin(2 * np.pi * (150.0 + 50.0 * np.sin(2 * np.pi * t)) * t) + 0.01 * rng.standard_normal(len(t)))
+    if samples_dir:
+        for fname in sorted(os.listdir(samples_dir)):
+            try:
+                with open(os.path.join(samples_dir, fname), "rb") as fh:
+                    y, _, _ = decode_audio_bytes(fh.read(), fname, target_sr=BUFFER_SR)
+                clips.append(y)
+            except Exception as e:
+                print(f"[Export] Skipping {fname}: {e}")
+    return [np.asarray(c, dtype=np.float32) for c in clips]
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp_logits = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp_logits / exp_logits.sum(axis=-1, keepdims=True)
+
+def verify_audio_backend(reference, candidate, processor, clips: List[np.ndarray]) -> Dict[str, Any]:
+    """Compare a candidate backend with the PyTorch reference clip by clip (batch of one)."""
+    agree, drifts = 0, []
+    ref_times, cand_times = [], []
+    for clip in clips:
+        feeds = dict(processor(clip, sampling_rate=BUFFER_SR, return_tensors="np", padding=True))
+        t0 = time.perf_counter()
+        ref_probs = _softmax(reference.run(feeds))[0]
+        t1 = time.perf_counter()
+        cand_probs = _softmax(candidate.run(feeds))[0]
+        t2 = time.perf_counter()
+        ref_times.append(t1 - t0)
+        cand_times.append(t2 - t1)
+        agree += int(np.argmax(ref_probs) == np.argmax(cand_probs))
+        drifts.append(float(np.max(np.abs(ref_probs - cand_probs))))
+    return {
+        "backend": candidate.name,
+        "clips": len(clips),
+        "top_label_agreement": round(agree / max(1, len(clips)), 4),
+        "max_prob_drift": round(max(drifts), 6) if drifts else 0.0,
+        "mean_prob_drift": round(float(np.mean(drifts)), 6) if drifts else 0.0,
+        "reference_ms_per_clip": round(1000 * float(np.mean(ref_times)), 2) if ref_times else 0.0,
+        "candidate_ms_per_clip": round(1000 * float(np.mean(cand_times)), 2) if cand_times else 0.0
+    }
+
+def export_onnx_main(argv: List[str]) -> int:
+    """python FVATool.py export-onnx [--out-dir DIR] [--no-quantize] [--samples-dir DIR] ..."""
+    import argparse
+    import inspect
+    import json
+    from transformers import Wav2Vec2FeatureExtractor
+
+    parser = argparse.ArgumentParser(prog="FVATool.py export-onnx", description="Export the emotion model to ONNX and verify it against PyTorch.")
+    parser.add_argument("--out-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--no-quantize", action="store_true", help="skip the dynamic int8 variant")
+    parser.add_argument("--samples-dir", default=None, help="extra audio files to include in verification")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="minimum top-label agreement per backend")
+    parser.add_argument("--max-drift", type=float, default=0.1, help="maximum absolute probability drift per backend")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    fp32_path = onnx_model_path(False, args.out_dir)
+    int8_path = onnx_model_path(True, args.out_dir)
+
+    processor = Wav2Vec2FeatureExtractor.from_pretrained(MODEL_NAME)
+    model = _load_torch_audio_model()
+    dummy = processor(np.zeros(BUFFER_SR, dtype=np.float32), sampling_rate=BUFFER_SR, return_tensors="pt", padding=True)
+    with_mask = "attention_mask" in dummy
+    input_names = ["input_values"] + (["attention_mask"] if with_mask else [])
+    dynamic_axes = {name: {0: "batch", 1: "samples"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False  # dynamic_axes belongs to the TorchScript exporter
+
+    print(f"[Export] Writing {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=args.opset,
+            **export_kwargs
+        )
+    candidates = [OnnxAudioBackend(fp32_path, "onnx")]
+    if not args.no_quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"[Export] Writing {int8_path}")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        candidates.append(OnnxAudioBackend(int8_path, "onnx-int8"))
+
+    reference = TorchAudioBackend(model)
+    clips = _verification_clips(args.samples_dir)
+    reports = [verify_audio_backend(reference, candidate, processor, clips) for candidate in candidates]
+    for report, candidate in zip(reports, candidates):
+        report["path"] = candidate.path
+        report["size_mb"] = round(os.path.getsize(candidate.path) / 1e6, 2)
+        report["passed"] = report["top_label_agreement"] >= args.min_agreement and report["max_prob_drift"] <= args.max_drift
+    print(json.dumps({"model": MODEL_NAME, "model_version": MODEL_VERSION, "reports": reports}, indent=2))
+    return 0 if all(r["passed"] for r in reports) else 1
+
 # -----------------------
 # Run
 # -----------------------
 if __name__ == "__main__":
+    if _cli_subcommand() == "export-onnx":
+        sys.exit(export_onnx_main(sys.argv[2:]))
     # local dev only — for production use gunicorn/uvicorn + TLS
     # Disable dotenv loading to avoid encoding issues with binary files
     import os as os_module
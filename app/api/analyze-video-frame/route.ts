@@ -19,6 +19,11 @@ export async function POST(request: NextRequest): Promise<NextResponse> {
       const backendFormData = new FormData()
       backendFormData.append("frame", frameFile)
       backendFormData.append("conf", conf as string)
+      // Forwarded so the backend can keep one latest-frame slot per client
+      for (const field of ["client_id", "captured_at"]) {
+        const value = formData.get(field)
+        if (value) backendFormData.append(field, value as string)
+      }
 
       const backendResponse = await fetch(`${backendUrl}/infer_frame`, {
         method: "POST",
@@ -0,0 +1,329 @@
+"""
+Benchmark suite for the FVATool audio and video pipelines.
+
+    python benchmark.py run --out bench_before.json
+    python benchmark.py run --out bench_after.json
+    python benchmark.py compare bench_before.json bench_after.json
+
+All inputs are synthesized offline from a fixed seed (tones, noise, speech-like
+bursts, moving-shape videos), so two runs on the same machine measure the code
+rather than the data. `compare` exits with status 1 when any case regresses.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List, Callable
+
+import numpy as np
+import soundfile as sf
+import cv2
+
+SEED = 1234
+SR = 16000
+
+
+# -----------------------
+# Synthetic inputs
+# -----------------------
+def make_tone(seconds: float, sr: int = SR) -> np.ndarray:
+    t = np.arange(int(seconds * sr)) / sr
+    # Voiced-like tone: 180 Hz fundamental with decaying harmonics
+    y = sum((0.3 / k) * np.sin(2 * np.pi * 180 * k * t) for k in range(1, 6))
+    return y.astype(np.float32)
+
+def make_noise(seconds: float, sr: int = SR) -> np.ndarray:
+    rng = np.random.default_rng(SEED)
+    return (0.1 * rng.standard_normal(int(seconds * sr))).astype(np.float32)
+
+def make_speech_bursts(seconds: float, sr: int = SR) -> np.ndarray:
+    """Syllable-rate bursts of a pitch-gliding harmonic tone with short pauses and a little noise."""
+    rng = np.random.default_rng(SEED + 1)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = sum((0.4 / k) * np.sin(k * phase) for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 2
+    # Drop roughly one syllable in four to leave pauses
+    gates = rng.random(int(seconds * 4) + 1) > 0.25
+    envelope *= gates[(t * 4).astype(int)]
+    y = voiced * envelope + 0.01 * rng.standard_normal(n)
+    return y.astype(np.float32)
+
+AUDIO_GENERATORS = {"tone": make_tone, "noise": make_noise, "speech": make_speech_bursts}
+
+def wav_bytes(y: np.ndarray, sr: int = SR) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+def make_video(path: str, seconds: float = 4.0, fps: int = 25, width: int = 320, height: int = 240) -> str:
+    """Write a small mp4 with two moving shapes over a fixed random background."""
+    rng = np.random.default_rng(SEED)
+    background = rng.integers(0, 255, (height, width, 3)).astype(np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        x = int((i * 4) % (width - 60))
+        cv2.rectangle(frame, (x, 60), (x + 60, 140), (0, 0, 255), -1)
+        cv2.circle(frame, (width - x - 30, 180), 25, (255, 255, 0), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def jpeg_bytes(width: int = 640, height: int = 480) -> bytes:
+    rng = np.random.default_rng(SEED)
+    frame = rng.integers(0, 255, (height, width, 3)).astype(np.uint8)
+    cv2.rectangle(frame, (100, 100), (300, 400), (0, 0, 255), -1)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+# -----------------------
+# Measurement
+# -----------------------
+def _percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+def measure(fn: Callable[[], Any], repeats: int, warmup: int, units: float = 1.0) -> Dict[str, Any]:
+    """
+    Time fn() `repeats` times after `warmup` untimed calls, then run it once more
+    under tracemalloc for peak Python/numpy allocation (kept out of the timed runs).
+    `units` is the amount of work per call (e.g. seconds of audio) for throughput.
+    """
+    for _ in range(warmup):
+        fn()
+    samples_ms = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples_ms.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    mean_ms = float(np.mean(samples_ms))
+    return {
+        "repeats": repeats,
+        "p50_ms": _percentile(samples_ms, 50),
+        "p95_ms": _percentile(samples_ms, 95),
+        "p99_ms": _percentile(samples_ms, 99),
+        "mean_ms": round(mean_ms, 3),
+        "min_ms": round(min(samples_ms), 3),
+        "throughput_per_s": round(units * 1000.0 / mean_ms, 3) if mean_ms > 0 else None,
+        "peak_alloc_mb": round(peak / (1024 * 1024), 3),
+    }
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def _environment(F) -> Dict[str, Any]:
+    import torch
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "model_version": F.MODEL_VERSION,
+        "audio_backend": F.AUDIO_BACKEND,
+    }
+
+
+# -----------------------
+# Cases
+# -----------------------
+def audio_cases(F, lengths: List[float], repeats: int, warmup: int) -> Dict[str, Any]:
+    results = {}
+    for kind, generate in AUDIO_GENERATORS.items():
+        for seconds in lengths:
+            y = generate(seconds)
+            tag = f"{kind}_{seconds:g}s"
+            print(f"[Bench] audio {tag}")
+
+            results[f"audio.features.{tag}"] = measure(
+                lambda: F.compute_basic_audio_features(y, SR), repeats, warmup, units=seconds)
+            results[f"audio.model.{tag}"] = measure(
+                lambda: F.AUDIO_BATCHER.submit(y, SR), repeats, warmup, units=seconds)
+
+            feats = F.compute_basic_audio_features(y, SR)
+            logits, batch_stats = F.AUDIO_BATCHER.submit(y, SR)
+
+            def postprocess():
+                # The same helpers _analyze_audio runs after the forward pass
+                prediction = F._prediction_from_probs(F._softmax_probs(logits))
+                F._build_audio_response(prediction, feats, batch_stats, time.time())
+            results[f"audio.postprocess.{tag}"] = measure(postprocess, repeats, warmup)
+
+            results[f"audio.pipeline.{tag}"] = measure(
+                lambda: F._process_array_and_build_response(y, SR), repeats, warmup, units=seconds)
+
+            data = wav_bytes(y)
+            results[f"audio.decode.{tag}"] = measure(
+                lambda: F.decode_audio_bytes(data, "bench.wav"), repeats, warmup, units=seconds)
+    return results
+
+def video_cases(F, workdir: str, repeats: int, warmup: int, seconds: float) -> Dict[str, Any]:
+    if not F.wait_for_model("video"):
+        print("[Bench] video model unavailable, skipping video cases")
+        return {}
+    path = make_video(os.path.join(workdir, "bench.mp4"), seconds=seconds)
+    results = {}
+    variants = {
+        "detect": {"mode": "detect", "sampling": "adaptive"},
+        "detect_fixed": {"mode": "detect", "sampling": "fixed"},
+        "track": {"mode": "track"},
+    }
+    for name, kwargs in variants.items():
+        print(f"[Bench] video {name}")
+        results[f"video.process.{name}"] = measure(
+            lambda: F._process_video(path, conf_threshold=0.25, **kwargs), repeats, warmup, units=seconds)
+    return results
+
+def endpoint_cases(F, workdir: str, repeats: int, warmup: int, video: bool) -> Dict[str, Any]:
+    client = F.app.test_client()
+    speech = make_speech_bursts(3.0)
+    audio = wav_bytes(speech)
+    chunk = wav_bytes(speech[: SR // 2])
+    frame = jpeg_bytes()
+    results = {}
+
+    def post(path: str, files: Dict[str, Any], fields: Dict[str, str] = None):
+        # cache=0 so every call measures a real analysis rather than a result cache hit
+        payload = {"cache": "0", **(fields or {})}
+        for field, (data, name) in files.items():
+            payload[field] = (io.BytesIO(data), name)
+        resp = client.post(path, data=payload, content_type="multipart/form-data")
+        if resp.status_code != 200:
+            raise RuntimeError(f"{path} returned {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        return resp
+
+    print("[Bench] endpoints")
+    results["e2e.infer.speech_3s"] = measure(lambda: post("/infer", {"audio": (audio, "bench.wav")}),
+                                             repeats, warmup, units=3.0)
+    results["e2e.infer_chunk.speech_0.5s"] = measure(
+        lambda: post("/infer_chunk", {"audio": (chunk, "chunk.wav")}, {"session_id": "bench"}),
+        repeats, warmup, units=0.5)
+    if video:
+        results["e2e.infer_frame.640x480"] = measure(lambda: post("/infer_frame", {"frame": (frame, "bench.jpg")}),
+                                                     repeats, warmup)
+        video_data = open(make_video(os.path.join(workdir, "bench_e2e.mp4"), seconds=2.0), "rb").read()
+        results["e2e.infer_video.2s"] = measure(lambda: post("/infer_video", {"video": (video_data, "bench.mp4")}),
+                                                max(1, repeats // 2), min(warmup, 1), units=2.0)
+    return results
+
+def run_main(args) -> int:
+    import FVATool as F
+
+    print("[Bench] waiting for models...")
+    if not F.wait_for_model("audio", timeout=600):
+        print(f"[Bench] audio model not ready: {F.MODEL_STATUS['audio']}")
+        return 2
+    has_video = not args.skip_video and F.wait_for_model("video", timeout=600)
+
+    lengths = [1.0, 3.0] if args.quick else [1.0, 3.0, 10.0]
+    repeats = 5 if args.quick else args.repeats
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fva_bench_") as workdir:
+        results.update(audio_cases(F, lengths, repeats, args.warmup))
+        if has_video:
+            results.update(video_cases(F, workdir, max(1, repeats // 2), min(args.warmup, 1), seconds=4.0))
+        results.update(endpoint_cases(F, workdir, repeats, args.warmup, has_video))
+
+    report = {
+        "environment": _environment(F),
+        "settings": {"repeats": repeats, "warmup": args.warmup, "audio_lengths_s": lengths, "video": has_video},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'case':<40} {'p50_ms':>10} {'p95_ms':>10} {'p99_ms':>10} {'per_s':>10} {'alloc_mb':>9}")
+    for name, r in results.items():
+        print(f"{name:<40} {r['p50_ms']:>10} {r['p95_ms']:>10} {r['p99_ms']:>10} "
+              f"{r['throughput_per_s']:>10} {r['peak_alloc_mb']:>9}")
+    print(f"[Bench] peak RSS {report['peak_rss_mb']} MB, results written to {args.out}")
+    return 0
+
+def compare_main(args) -> int:
+    """Flag cases whose p50 or p95 grew by more than the threshold (and by more than min_delta_ms)."""
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    if base["environment"].get("platform") != cand["environment"].get("platform"):
+        print("[Bench] warning: runs come from different platforms, timings may not be comparable")
+
+    regressions = []
+    print(f"{'case':<40} {'base_p50':>10} {'new_p50':>10} {'change':>8} {'base_p95':>10} {'new_p95':>10} {'change':>8}")
+    for name, b in base["results"].items():
+        c = cand["results"].get(name)
+        if c is None:
+            print(f"{name:<40} missing from candidate")
+            continue
+        row, flagged = [], False
+        for stat in ("p50_ms", "p95_ms"):
+            change = (c[stat] - b[stat]) / b[stat] if b[stat] else 0.0
+            if change > args.threshold and c[stat] - b[stat] > args.min_delta_ms:
+                flagged = True
+            row.append(f"{b[stat]:>10} {c[stat]:>10} {change:>+8.1%}")
+        print(f"{name:<40} {' '.join(row)}{'  REGRESSION' if flagged else ''}")
+        if flagged:
+            regressions.append(name)
+
+    for name in cand["results"]:
+        if name not in base["results"]:
+            print(f"{name:<40} new case")
+
+    b_rss, c_rss = base.get("peak_rss_mb"), cand.get("peak_rss_mb")
+    if b_rss and c_rss:
+        print(f"[Bench] peak RSS {b_rss} MB -> {c_rss} MB ({(c_rss - b_rss) / b_rss:+.1%})")
+    if regressions:
+        print(f"[Bench] {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("[Bench] no regressions")
+    return 0
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the FVATool audio and video pipelines")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmark suite and save results as JSON")
+    run.add_argument("--out", default="bench_results.json")
+    run.add_argument("--repeats", type=int, default=20)
+    run.add_argument("--warmup", type=int, default=2)
+    run.add_argument("--quick", action="store_true", help="fewer repeats and no 10s clips")
+    run.add_argument("--skip-video", action="store_true")
+
+    cmp_ = sub.add_parser("compare", help="compare two result files and flag regressions")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("candidate")
+    cmp_.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    cmp_.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+
+    args = parser.parse_args(argv)
+    return run_main(args) if args.command == "run" else compare_main(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -49,6 +49,7 @@ export default function RecorderCard({
   const canvasRef = useRef<HTMLCanvasElement | null>(null) // For capturing video frames
   const isRecordingRef = useRef<boolean>(false) // Use ref to track recording state for animation loop
   const videoAnalysisIntervalRef = useRef<NodeJS.Timeout | null>(null) // For periodic video analysis
+  const frameClientIdRef = useRef<string>(`client_${Date.now()}_${Math.random().toString(36).slice(2, 10)}`) // Lets the backend drop stale frames per client
 
   useEffect(() => {
     return () => {
@@ -273,6 +274,8 @@ export default function RecorderCard({
           const formData = new FormData()
           formData.append("frame", blob, "frame.jpg")
           formData.append("conf", "0.25") // Confidence threshold
+          formData.append("client_id", frameClientIdRef.current)
+          formData.append("captured_at", String(Date.now()))
 
           const response = await fetch("/api/analyze-video-frame", {
             method: "POST",
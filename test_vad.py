@@ -0,0 +1,46 @@
+"""
+Regression tests for the voice activity detection stage.
+
+    python -m pytest test_vad.py
+"""
+import os
+
+import numpy as np
+
+os.environ.setdefault("MODEL_AUTOLOAD", "0")  # the VAD needs no models; do not start the downloads
+import FVATool as F  # noqa: E402
+
+SR = 16000
+
+
+def voiced(seconds: float) -> np.ndarray:
+    """Steady voiced-like tone: 180 Hz fundamental with decaying harmonics."""
+    t = np.arange(int(seconds * SR)) / SR
+    return sum((0.3 / k) * np.sin(2 * np.pi * 180 * k * t) for k in range(1, 6)).astype(np.float32)
+
+
+def test_stationary_voiced_clip_is_kept():
+    y = voiced(2.0)
+    trimmed, stats = F.trim_to_speech(y, SR)
+    assert stats["speech_ratio"] == 1.0
+    assert len(trimmed) == len(y)
+
+
+def test_stationary_noise_is_dropped():
+    y = (0.1 * np.random.default_rng(0).standard_normal(2 * SR)).astype(np.float32)
+    assert F.detect_speech_regions(y, SR) == []
+
+
+def test_silence_is_dropped():
+    assert F.detect_speech_regions(np.zeros(2 * SR, dtype=np.float32), SR) == []
+
+
+def test_speech_between_silences_is_trimmed():
+    gap = np.zeros(SR, dtype=np.float32)
+    y = np.concatenate([gap, voiced(1.0), gap])
+    regions = F.detect_speech_regions(y, SR)
+    assert len(regions) == 1
+    start, end = regions[0]
+    pad = int(SR * F.VAD_PAD_MS / 1000) + int(SR * F.VAD_FRAME_MS / 1000)
+    assert SR - pad <= start <= SR
+    assert 2 * SR <= end <= 2 * SR + pad